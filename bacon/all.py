@@ -9,6 +9,7 @@ from bacon.mouse_input import *
 from bacon.resource import *
 from bacon.shader import *
 from bacon.sound import *
+from bacon.sprite_sheet import *
 from bacon.text import *
 from bacon.window import *
 
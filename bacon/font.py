@@ -1,10 +1,29 @@
 from ctypes import *
+import hashlib
+import json
+import os
+import string
 
 from bacon.core import lib
 from bacon import native
 from bacon import resource
+from bacon import text
 import bacon.image
 
+import logging
+logger = logging.getLogger('bacon')
+
+#: Directory in which glyph metrics are cached between runs.  If ``None`` (the default), no glyph cache
+#: is read or written.  Set this on the ``bacon.font`` module, not on ``bacon``, before any :class:`Font`
+#: is constructed, for example::
+#:
+#:     bacon.font.glyph_cache_dir = os.path.join(bacon.resource.resource_dir, 'cache')
+glyph_cache_dir = None
+
+# Characters Font.prewarm rasterizes by default: string.printable without the control whitespace
+# (tab, newline, etc.), which is laid out but never drawn
+_drawable_ascii = string.ascii_letters + string.digits + string.punctuation + ' '
+
 class FontMetrics(object):
     '''Aggregates pixel metrics for a font loaded at a particular size.  See :attr:`Font.metrics`
 
@@ -67,11 +86,28 @@ class Glyph(object):
         '''Horizontal advance, in pixels'''
         return self._advance
 
+class _CachedGlyph(Glyph):
+    '''A glyph whose metrics were read from the glyph cache.  The image is rasterized the first time it
+    is requested, so layout and measurement never touch the rasterizer.
+    '''
+    def __init__(self, font, char, has_image, offset_x, offset_y, advance):
+        super(_CachedGlyph, self).__init__(char, None, offset_x, offset_y, advance)
+        self._font = font
+        self._has_image = has_image
+
+    @property
+    def image(self):
+        '''The :class:`Image` of the glyph'''
+        if self._has_image and self._image is None:
+            self._image = self._font._rasterize_glyph(self._char).image
+        return self._image
+
 class _FontFile(object):
     _font_files = {}
     _default_font_file = None
 
     def __init__(self, file, handle=None):
+        self._file = file
         if not handle:
             handle = c_int()
             lib.LoadFont(byref(handle), resource.get_resource_path(file).encode('utf-8'))
@@ -117,6 +153,16 @@ class _FontFile(object):
                      round(offset_y.value) / content_scale, 
                      round(advance.value) / content_scale)
 
+    def get_cache_key(self):
+        if self._file is None:
+            return 'default:%s' % bacon.core.version
+        path = resource.get_resource_path(self._file)
+        try:
+            st = os.stat(path)
+            return '%s:%d:%d' % (os.path.abspath(path), st.st_size, int(st.st_mtime))
+        except OSError:
+            return os.path.abspath(path)
+
     @classmethod
     def get_font_file(cls, file):
         try:
@@ -146,6 +192,10 @@ class Font(object):
 
     Fonts are never unloaded.
 
+    Glyphs are rasterized the first time they are needed.  To avoid a stall the first time a string is drawn,
+    call :func:`prewarm` with the characters you expect to render.  If :data:`glyph_cache_dir` is set, glyph
+    metrics are also cached on disk, so that later runs can lay out and measure text without rasterizing.
+
     :param str file: path to a font file to load.  Supported formats include TrueType, OpenType, PostScript, etc.  If ``None``, a default font is used
     :param float size: the point size to load the font at
     :param bool light_hinting: applies minimal autohinting to the outline; suitable for fonts designed 
@@ -168,12 +218,16 @@ class Font(object):
         self._content_scale = content_scale
         
         self._glyphs = { }
+        self._advances = { }
+        self._measurements = { }
         self._flags = 0
 
         if light_hinting:
             self._flags |= native.FontFlags.light_hinting
 
         self._metrics = self._font_file.get_metrics(size)
+        self._cache_dirty = False
+        self._load_glyph_cache()
 
     @property
     def metrics(self):
@@ -201,13 +255,157 @@ class Font(object):
         try:
             return self._glyphs[char]
         except KeyError:
-            glyph = self._font_file.get_glyph(self._size, self._content_scale, char, self._flags)
-            self._glyphs[char] = glyph
-            return glyph
+            return self._rasterize_glyph(char)
 
     def get_glyphs(self, str):
         '''Retrieves a list of :class:`Glyph` for the given string.
 
         :param str: the string to render
         '''
-        return [self.get_glyph(c) for c in str]
\ No newline at end of file
+        return [self.get_glyph(c) for c in str]
+
+    _max_measurements = 1024
+
+    def measure(self, str, width=None, overflow=text.Overflow.wrap):
+        '''Measure the extents of a string rendered in this font, without building a :class:`GlyphLayout`.
+        Only glyph advances and the font metrics are used, and results are memoized, so this is cheap
+        enough to size many labels every frame.
+
+        :param str: the string to measure
+        :param width: optional width to wrap the text at, as for :class:`GlyphLayout`
+        :param overflow: how to wrap lines wider than ``width``, a member of :class:`Overflow`
+        :return: a tuple ``(width, height)`` giving the width of the widest line and the total height
+            of all lines, in pixels
+        '''
+        key = (str, width, overflow)
+        try:
+            return self._measurements[key]
+        except KeyError:
+            pass
+
+        advances = self._advances
+        prefix = [0]
+        breaks = []
+        x = 0
+        for i, char in enumerate(str):
+            try:
+                advance = advances[char]
+            except KeyError:
+                advance = advances[char] = self.get_glyph(char).advance
+            if char in text._break_chars:
+                breaks.append(i)
+            x += advance
+            prefix.append(x)
+
+        if width is None or overflow == text.Overflow.none or x <= width:
+            line_widths = [x]
+        else:
+            line_widths = [prefix[end[1]] - prefix[start[1]]
+                           for start, end, _, _ in text._wrap([(prefix, breaks)], width, overflow, (0, 0))]
+
+        metrics = self._metrics
+        result = (max(line_widths), len(line_widths) * (metrics.descent - metrics.ascent))
+
+        if len(self._measurements) >= self._max_measurements:
+            self._measurements.clear()
+        self._measurements[key] = result
+        return result
+
+    def measure_many(self, strs, width=None, overflow=text.Overflow.wrap):
+        '''Measure several strings at once; see :func:`measure`.
+
+        :param strs: a sequence of strings to measure
+        :return: a list of ``(width, height)`` tuples, one per string
+        '''
+        measure = self.measure
+        return [measure(s, width, overflow) for s in strs]
+
+    def _rasterize_glyph(self, char):
+        glyph = self._font_file.get_glyph(self._size, self._content_scale, char, self._flags)
+        # Rasterizing a glyph loaded from the cache does not change its metrics
+        if char not in self._glyphs:
+            self._cache_dirty = True
+        self._glyphs[char] = glyph
+        return glyph
+
+    def prewarm(self, charset=_drawable_ascii, max_glyphs=None):
+        '''Rasterize the glyphs for a set of characters ahead of time, so that drawing them for the
+        first time does not stall the frame.  Glyphs that are already rasterized are skipped.
+
+        The native rasterizer and renderer can only be used from the main thread.  To spread the work
+        over several frames, for example behind a loading screen, pass ``max_glyphs`` and call this
+        each frame until it returns ``True``::
+
+            def on_tick(self):
+                if not font.prewarm(max_glyphs=8):
+                    ...
+
+        If :data:`glyph_cache_dir` is set, the glyph cache is saved once all glyphs are rasterized.
+
+        :param charset: a string of characters to rasterize; defaults to the ASCII letters, digits, punctuation
+            and space
+        :param max_glyphs: optional maximum number of glyphs to rasterize in this call
+        :return: ``True`` if every glyph in ``charset`` is now rasterized
+        '''
+        rasterized = 0
+        for char in charset:
+            glyph = self._glyphs.get(char)
+            if glyph is None or type(glyph) is _CachedGlyph and glyph._has_image and glyph._image is None:
+                if max_glyphs is not None and rasterized >= max_glyphs:
+                    return False
+                self._rasterize_glyph(char)
+                rasterized += 1
+        self.save_glyph_cache()
+        return True
+
+    def _get_glyph_cache_path(self):
+        if glyph_cache_dir is None:
+            return None
+        key = '%s:%r:%r:%d' % (self._font_file.get_cache_key(), self._size, self._content_scale, self._flags)
+        return os.path.join(glyph_cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _load_glyph_cache(self):
+        path = self._get_glyph_cache_path()
+        if path is None or not os.path.exists(path):
+            return
+
+        try:
+            with open(path, 'r') as f:
+                entries = json.load(f)
+        except (IOError, ValueError):
+            logger.warning('Ignoring unreadable glyph cache %s', path)
+            return
+
+        for char, (has_image, offset_x, offset_y, advance) in entries.items():
+            self._glyphs[char] = _CachedGlyph(self, char, has_image, offset_x, offset_y, advance)
+
+    def save_glyph_cache(self):
+        '''Write the metrics of all glyphs rasterized so far to :data:`glyph_cache_dir`.  Does nothing
+        if the glyph cache is disabled or no new glyphs have been rasterized since it was last written.
+        '''
+        path = self._get_glyph_cache_path()
+        if path is None or not self._cache_dirty:
+            return
+
+        entries = {}
+        for char, glyph in list(self._glyphs.items()):
+            if type(glyph) is _CachedGlyph:
+                has_image = glyph._has_image
+            else:
+                has_image = glyph.image is not None
+            entries[char] = (has_image, glyph.offset_x, glyph.offset_y, glyph.advance)
+
+        try:
+            if not os.path.isdir(glyph_cache_dir):
+                os.makedirs(glyph_cache_dir)
+            with open(path, 'w') as f:
+                json.dump(entries, f)
+            self._cache_dirty = False
+        except (IOError, OSError):
+            logger.warning('Unable to write glyph cache %s', path)
+
+__all__ = [
+    'FontMetrics',
+    'Glyph',
+    'Font',
+]
@@ -8,6 +8,7 @@ from bacon import controller
 from bacon import keyboard
 from bacon import graphics
 from bacon import mouse_input
+from bacon import resource
 from bacon import shader
 from bacon import window
 
@@ -146,9 +147,10 @@ def _tick_callback():
 
     _time_uniform.value = now_time
 
-    graphics._target_stack = [None]
+    graphics._begin_frame()
     window._begin_frame()
     mouse_input.mouse._update_position()
+    resource._update_loaders()
 
     try:
         bacon._current_game.on_tick()
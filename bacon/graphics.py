@@ -1,50 +1,129 @@
 from ctypes import *
+import math
+
 from bacon.core import lib
 from bacon import native
 import bacon
+import bacon.core
 
 BlendFlags = native.BlendFlags
 
-if native._mock_native:
-    def push_transform():
-        pass
-else:
-    push_transform = lib.PushTransform
-push_transform.__doc__ = '''Save the current graphics transform by pushing it on the transform stack.  It can be restored by
-calling :func:`pop_transform`.
-'''
-
-if native._mock_native:
-    def pop_transform():
-        pass
-else:
-    pop_transform = lib.PopTransform
-pop_transform.__doc__ = '''Restore a previously saved transform by popping it off the transform stack.
-'''
-
-if native._mock_native:
-    def translate(x, y):
-        pass
-else:
-    translate = lib.Translate
-translate.__doc__ = '''Translate the current graphics transform by ``(x, y)`` units.
-'''
-
-if native._mock_native:
-    def scale(sx, sy):
-        pass
-else:
-    scale = lib.Scale
-scale.__doc__ = '''Scale the current graphics transform by multiplying through ``(sx, sy)``.
-'''
-
-if native._mock_native:
-    def rotate(radians):
-        pass
-else:
-    rotate = lib.Rotate
-rotate.__doc__ = '''Rotate the current graphics transform by ``radians`` counter-clockwise.
-'''
+# The renderer's state is shadowed here so that calls which would not change it never reach the
+# native library.  Color is tracked entirely in Python and applied lazily before each draw, so
+# that a push_color/set_color/pop_color sequence with no drawing in between costs nothing.
+# Transform pushes are deferred until the transform is actually modified.
+
+class RenderStats(object):
+    '''Counts of render state changes requested during a frame.  See :func:`get_render_stats`.
+    '''
+    def __init__(self):
+        #: Number of state changes that were passed through to the renderer.
+        self.issued = 0
+        #: Number of state changes that were skipped, because they would not have affected drawing.
+        self.elided = 0
+
+    def __repr__(self):
+        return 'RenderStats(issued=%d, elided=%d)' % (self.issued, self.elided)
+
+_white = (1.0, 1.0, 1.0, 1.0)
+
+def _reset_state():
+    global _color, _native_color, _color_requests, _color_stack, _transform_stack, _native_target, _viewport_set, _shader_handle, _blending
+    _color = _white             # color subsequent drawing should use
+    _native_color = _white      # color last set on the renderer
+    _color_requests = 0         # color changes since the color was last set on the renderer
+    _color_stack = []
+    _transform_stack = []       # one entry per push_transform; True if PushTransform was issued for it
+    _native_target = None
+    _viewport_set = False       # True if set_viewport was called since the target was last set
+    _shader_handle = 0
+    _blending = None            # not reset by the renderer each frame, so always reissued once
+
+_reset_state()
+_stats = RenderStats()
+_last_frame_stats = RenderStats()
+
+def _begin_frame():
+    global _target_stack, _stats, _last_frame_stats
+    _target_stack = [None]
+    # Color changes not followed by any drawing were never needed
+    _stats.elided += _color_requests
+    _reset_state()
+    _last_frame_stats = _stats
+    _stats = RenderStats()
+
+def get_render_stats():
+    '''Get the number of render state changes issued to and elided from the renderer during the previous
+    frame.  State changes are color, transform, shader, blending and target changes.
+
+    :return: :class:`RenderStats`
+    '''
+    return _last_frame_stats
+
+def _stack_underflow():
+    return bacon.core.StackUnderflowError(native.ErrorCodes.stack_underflow)
+
+def _flush_color():
+    # Of the color changes made since the color was last set, only the final one is issued
+    global _native_color, _color_requests
+    lib.SetColor(*_color)
+    _native_color = _color
+    _stats.issued += 1
+    if _color_requests:
+        _stats.elided += _color_requests - 1
+        _color_requests = 0
+
+def _modify_transform():
+    if _transform_stack and not _transform_stack[-1]:
+        lib.PushTransform()
+        _transform_stack[-1] = True
+        _stats.issued += 1
+    _stats.issued += 1
+
+def push_transform():
+    '''Save the current graphics transform by pushing it on the transform stack.  It can be restored by
+    calling :func:`pop_transform`.
+    '''
+    _transform_stack.append(False)
+
+def pop_transform():
+    '''Restore a previously saved transform by popping it off the transform stack.
+    '''
+    if not _transform_stack:
+        raise _stack_underflow()
+    if _transform_stack.pop():
+        lib.PopTransform()
+        _stats.issued += 1
+    else:
+        # Nothing was modified since the push, so neither was issued
+        _stats.elided += 2
+
+def translate(x, y):
+    '''Translate the current graphics transform by ``(x, y)`` units.
+    '''
+    if x == 0 and y == 0:
+        _stats.elided += 1
+        return
+    _modify_transform()
+    lib.Translate(x, y)
+
+def scale(sx, sy):
+    '''Scale the current graphics transform by multiplying through ``(sx, sy)``.
+    '''
+    if sx == 1 and sy == 1:
+        _stats.elided += 1
+        return
+    _modify_transform()
+    lib.Scale(sx, sy)
+
+def rotate(radians):
+    '''Rotate the current graphics transform by ``radians`` counter-clockwise.
+    '''
+    if radians == 0:
+        _stats.elided += 1
+        return
+    _modify_transform()
+    lib.Rotate(radians)
 
 def set_transform(matrix):
     '''Replace the current graphics transform with the given 4x4 matrix.  For example, to replace
@@ -57,57 +136,53 @@ def set_transform(matrix):
 
     :param matrix: a 4x4 matrix in column major order, represented as a flat 16 element sequence.
     '''
+    _modify_transform()
     lib.SetTransform((c_float * 16)(*matrix))
 
-if native._mock_native:
-    def push_color():
-        pass
-else:
-    push_color = lib.PushColor
-push_color.__doc__ = '''Save the current graphics color by pushing it on the color stack.  It can be restored with :func:`pop_color`.
-
-The color stack is cleared at the beginning of each frame, and the default color reset to white.
-'''
-
-if native._mock_native:
-    def pop_color():
-        pass
-else:
-    pop_color = lib.PopColor
-pop_color.__doc__ = '''Restore a previously saved graphics color by popping it off the color stack.
-'''
-
-if native._mock_native:
-    def set_color(r, g, b, a):
-        pass
-else:
-    set_color = lib.SetColor
-set_color.__doc__ = '''Set the current graphics color to the given RGBA values.  Typically each component has a value between
-0.0 and 1.0, however out-of-range values are permitted and may be used for special effects with an 
-appropriate shader.
-
-The color is reset to white at the beginning of each frame.
-'''
-
-if native._mock_native:
-    def multiply_color(r, g, b, a):
-        pass
-else:
-    multiply_color = lib.MultiplyColor
-multiply_color.__doc__ = '''multiply_color(r, g, b, a)
-
-Multiplies the current graphics color component-wise by the given RGBA values.
-'''
-
-if native._mock_native:
-    def clear(r, g, b, a):
-        pass
-else:
-    clear = lib.Clear
-clear.__doc__ = '''Clear the current target to the given RGBA color.  Each color component must be in the range 0.0 to 1.0.
-You should clear the window at the beginning of each frame.  Failure to do so may cause visual
-artifacts and/or poor performance on some platforms.
-'''
+def push_color():
+    '''Save the current graphics color by pushing it on the color stack.  It can be restored with :func:`pop_color`.
+
+    The color stack is cleared at the beginning of each frame, and the default color reset to white.
+    '''
+    _color_stack.append(_color)
+    _stats.elided += 1
+
+def pop_color():
+    '''Restore a previously saved graphics color by popping it off the color stack.
+    '''
+    global _color, _color_requests
+    if not _color_stack:
+        raise _stack_underflow()
+    _color = _color_stack.pop()
+    _color_requests += 1
+
+def set_color(r, g, b, a):
+    '''Set the current graphics color to the given RGBA values.  Typically each component has a value between
+    0.0 and 1.0, however out-of-range values are permitted and may be used for special effects with an 
+    appropriate shader.
+
+    The color is reset to white at the beginning of each frame.
+    '''
+    global _color, _color_requests
+    _color = (r, g, b, a)
+    _color_requests += 1
+
+def multiply_color(r, g, b, a):
+    '''multiply_color(r, g, b, a)
+
+    Multiplies the current graphics color component-wise by the given RGBA values.
+    '''
+    global _color, _color_requests
+    cr, cg, cb, ca = _color
+    _color = (cr * r, cg * g, cb * b, ca * a)
+    _color_requests += 1
+
+def clear(r, g, b, a):
+    '''Clear the current target to the given RGBA color.  Each color component must be in the range 0.0 to 1.0.
+    You should clear the window at the beginning of each frame.  Failure to do so may cause visual
+    artifacts and/or poor performance on some platforms.
+    '''
+    lib.Clear(r, g, b, a)
 
 _target_stack = [None]
 
@@ -136,23 +211,32 @@ def get_target():
     return _target_stack[-1] or bacon.window
 
 def _set_target(target):
+    global _native_target, _viewport_set
+    if target is bacon.window:
+        target = None
+    # Setting the target also resets the viewport, so it is only skipped if the viewport is unchanged
+    if target is _native_target and not _viewport_set:
+        _stats.elided += 1
+        return
+    _native_target = target
+    _viewport_set = False
+    _stats.issued += 1
     try:
         lib.SetFrameBuffer(target._handle, target._content_scale)
     except AttributeError:
         lib.SetFrameBuffer(0, bacon.window._content_scale)
 
-if native._mock_native:
-    def set_viewport(x, y, width, height):
-        pass
-else:
-    set_viewport = lib.SetViewport
-set_viewport.__doc__ = '''Set the current viewport in screen-space.  This affects both the GPU viewport, which provides a screen-space clip,
-and the projection matrix, which is constructed from the viewport coordinates automatically.
+def set_viewport(x, y, width, height):
+    '''Set the current viewport in screen-space.  This affects both the GPU viewport, which provides a screen-space clip,
+    and the projection matrix, which is constructed from the viewport coordinates automatically.
 
-Viewport coordinates are specified in pixel-space with (0, 0) at the upper-left corner.
+    Viewport coordinates are specified in pixel-space with (0, 0) at the upper-left corner.
 
-The viewport is reset to the window dimensions at the beginning of each frame, and when switching targets.
-'''
+    The viewport is reset to the window dimensions at the beginning of each frame, and whenever a target is pushed or popped.
+    '''
+    global _viewport_set
+    _viewport_set = True
+    lib.SetViewport(x, y, width, height)
 
 def set_shader(shader):
     '''Set the current graphics shader.  All subsequent drawing commands will be rendered with this shader.
@@ -162,21 +246,32 @@ def set_shader(shader):
 
     :param shader: a :class:`Shader` to render with
     '''
-    lib.SetShader(shader._handle if shader else 0)
-
-if native._mock_native:
-    def set_blending(src_blend, dest_blend):
-        pass
-else:
-    set_blending = lib.SetBlending
-set_blending.__doc__ = '''Set the current graphics blend mode.  All subsequent drawing commands will be rendered with this blend mode.
-
-The default blend mode is ``(BlendFlags.one, BlendFlags.one_minus_src_alpha)``, which is appropriate for
-premultiplied alpha.
-
-:param src_blend: a value from the :class:`BlendFlags` enumeration, specifying the blend contribution from the source fragment
-:param dest_blend: a value from the :class:`BlendFlags` enumeration, specifying the blend contribution from the destination fragment
-'''
+    global _shader_handle
+    handle = shader._handle if shader else 0
+    if handle == _shader_handle:
+        _stats.elided += 1
+        return
+    _shader_handle = handle
+    _stats.issued += 1
+    lib.SetShader(handle)
+
+def set_blending(src_blend, dest_blend):
+    '''Set the current graphics blend mode.  All subsequent drawing commands will be rendered with this blend mode.
+
+    The default blend mode is ``(BlendFlags.one, BlendFlags.one_minus_src_alpha)``, which is appropriate for
+    premultiplied alpha.
+
+    :param src_blend: a value from the :class:`BlendFlags` enumeration, specifying the blend contribution from the source fragment
+    :param dest_blend: a value from the :class:`BlendFlags` enumeration, specifying the blend contribution from the destination fragment
+    '''
+    global _blending
+    blending = (src_blend, dest_blend)
+    if blending == _blending:
+        _stats.elided += 1
+        return
+    _blending = blending
+    _stats.issued += 1
+    lib.SetBlending(src_blend, dest_blend)
 
 def draw_image(image, x1, y1, x2 = None, y2 = None):
     '''Draw an image.
@@ -192,8 +287,76 @@ def draw_image(image, x1, y1, x2 = None, y2 = None):
         x2 = x1 + image.width
     if y2 is None:
         y2 = y1 + image.height
+    if _color != _native_color:
+        _flush_color()
     lib.DrawImage(image._handle, x1, y1, x2, y2)
 
+def _draw_image_rects(image, rects):
+    # Draw an image stretched over each (x1, y1, x2, y2) in rects.  The library has no batched entry
+    # point for this, so it is one DrawImage per rect; only draw_image's per-call overhead is saved.
+    if _color != _native_color:
+        _flush_color()
+    draw = lib.DrawImage
+    handle = image._handle
+    for x1, y1, x2, y2 in rects:
+        draw(handle, x1, y1, x2, y2)
+
+# Buffers passed to DrawImageQuad, which copies them.  The texture coordinates and vertex colors match
+# those DrawImage uses; the current color is applied by the renderer.
+_quad_positions = (c_float * 12)()
+_quad_texcoords = (c_float * 8)(0, 1, 0, 0, 1, 0, 1, 1)
+_quad_colors = (c_float * 16)(*([1] * 16))
+
+def draw_image_transformed(image, x, y, rotation=0, sx=1, sy=1, origin_x=None, origin_y=None):
+    '''Draw an image rotated and scaled about an origin point.  This has the same result as::
+
+        bacon.push_transform()
+        bacon.translate(x, y)
+        bacon.rotate(rotation)
+        bacon.scale(sx, sy)
+        bacon.draw_image(image, -origin_x, -origin_y)
+        bacon.pop_transform()
+
+    The corners of the image are computed here instead, so the image is drawn with a single native call and
+    no transform changes.
+
+    :param image: an :class:`Image` to draw
+    :param x: position at which to draw the origin of the image
+    :param y: position at which to draw the origin of the image
+    :param rotation: counter-clockwise rotation about the origin, in radians
+    :param sx: horizontal scale factor; negative values flip the image
+    :param sy: vertical scale factor; negative values flip the image
+    :param origin_x: point within the image, in texels, to rotate and scale about; defaults to the center
+    :param origin_y: point within the image, in texels, to rotate and scale about; defaults to the center
+    '''
+    if origin_x is None:
+        origin_x = image.width / 2.0
+    if origin_y is None:
+        origin_y = image.height / 2.0
+
+    # Image corners relative to the origin, after scaling
+    left = -origin_x * sx
+    top = -origin_y * sy
+    right = (image.width - origin_x) * sx
+    bottom = (image.height - origin_y) * sy
+
+    if rotation == 0:
+        if _color != _native_color:
+            _flush_color()
+        lib.DrawImage(image._handle, x + left, y + top, x + right, y + bottom)
+    else:
+        # Corners in the same order as DrawImage: top-left, bottom-left, bottom-right, top-right.  The
+        # renderer has no depth, so z is always 0.
+        c = math.cos(rotation)
+        s = math.sin(rotation)
+        _quad_positions[:] = (x + left * c - top * s, y + left * s + top * c, 0,
+                              x + left * c - bottom * s, y + left * s + bottom * c, 0,
+                              x + right * c - bottom * s, y + right * s + bottom * c, 0,
+                              x + right * c - top * s, y + right * s + top * c, 0)
+        if _color != _native_color:
+            _flush_color()
+        lib.DrawImageQuad(image._handle, _quad_positions, _quad_texcoords, _quad_colors)
+
 def draw_image_region(image, x1, y1, x2, y2,
                       ix1, iy1, ix2, iy2):
     '''Draw a rectangular region of an image.
@@ -208,34 +371,129 @@ def draw_image_region(image, x1, y1, x2, y2,
 
     :param image: an :class:`Image` to draw
     '''
+    if _color != _native_color:
+        _flush_color()
     lib.DrawImageRegion(image._handle, x1, y1, x2, y2, ix1, iy1, ix2, iy2)
 
-if native._mock_native:
-    def draw_line(x1, y1, x2, y2):
-        pass
-else:
-    draw_line = lib.DrawLine
-draw_line.__doc__ = '''Draw a line from coordinates ``(x1, y1)`` to ``(x2, y2)``.
-
-No texture is applied.
-'''
-
-if native._mock_native:
-    def draw_rect(x1, y1, x2, y2):
-        pass
-else:
-    draw_rect = lib.DrawRect
-draw_rect.__doc__ = '''Draw a rectangle bounding coordinates ``(x1, y1)`` to ``(x2, y2)``.
-
-No texture is applied.
-'''
-
-if native._mock_native:
-    def fill_rect(x1, y1, x2, y2):
-        pass
-else:
-    fill_rect = lib.FillRect
-fill_rect.__doc__ = '''Fill a rectangle bounding coordinates ``(x1, y1)`` to ``(x2, y2)``.
-
-No texture is applied.
-'''
+def draw_line(x1, y1, x2, y2):
+    '''Draw a line from coordinates ``(x1, y1)`` to ``(x2, y2)``.
+
+    No texture is applied.
+    '''
+    if _color != _native_color:
+        _flush_color()
+    lib.DrawLine(x1, y1, x2, y2)
+
+def draw_rect(x1, y1, x2, y2):
+    '''Draw a rectangle bounding coordinates ``(x1, y1)`` to ``(x2, y2)``.
+
+    No texture is applied.
+    '''
+    if _color != _native_color:
+        _flush_color()
+    lib.DrawRect(x1, y1, x2, y2)
+
+def fill_rect(x1, y1, x2, y2):
+    '''Fill a rectangle bounding coordinates ``(x1, y1)`` to ``(x2, y2)``.
+
+    No texture is applied.
+    '''
+    if _color != _native_color:
+        _flush_color()
+    lib.FillRect(x1, y1, x2, y2)
+
+def _as_float_list(values):
+    # Flat list of floats; indexing a list is much cheaper than a ctypes or NumPy array
+    try:
+        return values.ravel().tolist()
+    except AttributeError:
+        return list(values)
+
+def _draw_lines(points, colors, step):
+    # The library has no batched line entry point, so each segment is one DrawLine.  Only the Python
+    # overhead of draw_line and set_color is saved, and SetColor is issued only where the color of
+    # consecutive segments differs; a gradient still sets the color for every segment.
+    global _native_color
+    points = _as_float_list(points)
+    vertex_count = len(points) // 2
+    draw = lib.DrawLine
+
+    if colors is None:
+        if _color != _native_color:
+            _flush_color()
+        for i in range(0, vertex_count - 1, step):
+            j = i * 2
+            draw(points[j], points[j + 1], points[j + 2], points[j + 3])
+        return
+
+    colors = _as_float_list(colors)
+    if len(colors) < vertex_count * 4:
+        raise ValueError('colors must have 4 components for each of the %d vertices' % vertex_count)
+
+    # Each segment has the color of its first vertex, counted in the stats like a set_color.  The
+    # current color is left as it was, and is reissued by the next draw call that uses it.
+    for i in range(0, vertex_count - 1, step):
+        color = tuple(colors[i * 4:i * 4 + 4])
+        if color != _native_color:
+            lib.SetColor(*color)
+            _native_color = color
+            _stats.issued += 1
+        else:
+            _stats.elided += 1
+        j = i * 2
+        draw(points[j], points[j + 1], points[j + 2], points[j + 3])
+
+def draw_lines(points, colors=None):
+    '''Draw a set of independent lines.  Each consecutive pair of vertices defines one line.
+
+    No texture is applied.  The renderer has no batched line call, so each line is still drawn separately;
+    compared with calling :func:`draw_line` in a loop, this only saves the per-call Python overhead and
+    color changes between lines of the same color.
+
+    :param points: flat sequence of vertex coordinates ``[x1, y1, x2, y2, ...]``, for example a list,
+        ``array.array('f')`` or NumPy array
+    :param colors: optional flat sequence of RGBA colors, one for each vertex, in the same formats as
+        ``points``.  If given, each line is drawn in the color of its first vertex instead of the current color.
+    '''
+    _draw_lines(points, colors, 2)
+
+def draw_line_strip(points, colors=None):
+    '''Draw a connected sequence of lines, from the first vertex through each vertex in turn to the last.
+
+    No texture is applied.  As with :func:`draw_lines`, each line is still drawn separately.
+
+    :param points: flat sequence of vertex coordinates ``[x1, y1, x2, y2, ...]``; see :func:`draw_lines`
+    :param colors: optional flat sequence of RGBA colors, one for each vertex; see :func:`draw_lines`
+    '''
+    _draw_lines(points, colors, 1)
+
+__all__ = [
+    'BlendFlags',
+    'RenderStats',
+    'get_render_stats',
+    'push_transform',
+    'pop_transform',
+    'translate',
+    'scale',
+    'rotate',
+    'set_transform',
+    'push_color',
+    'pop_color',
+    'set_color',
+    'multiply_color',
+    'clear',
+    'push_target',
+    'pop_target',
+    'get_target',
+    'set_viewport',
+    'set_shader',
+    'set_blending',
+    'draw_image',
+    'draw_image_transformed',
+    'draw_image_region',
+    'draw_line',
+    'draw_rect',
+    'fill_rect',
+    'draw_lines',
+    'draw_line_strip',
+]
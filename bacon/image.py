@@ -134,4 +134,94 @@ class Image(object):
         '''
         handle = c_int()
         lib.GetImageRegion(byref(handle), self._handle, x1, y1, x2, y2)
-        return Image(width = x2 - x1, height = y2 - y1, content_scale = self._content_scale, handle = handle)
\ No newline at end of file
+        return Image(width = x2 - x1, height = y2 - y1, content_scale = self._content_scale, handle = handle)
+
+class RenderTargetPool(object):
+    '''A pool of offscreen render targets, so that effects and transitions that need a temporary target reuse
+    one instead of allocating a new texture each time::
+
+        target = bacon.render_target_pool.acquire(width, height)
+        bacon.push_target(target)
+        bacon.clear(0, 0, 0, 0)
+        ...
+        bacon.pop_target()
+        ...
+        bacon.render_target_pool.release(target)
+
+    Targets are matched by size, content scale and the remaining :class:`Image` arguments.  A reused target
+    still holds whatever was last drawn to it, so should be cleared before use.
+
+    :param max_free: maximum number of released targets kept for reuse; beyond this, the least recently
+        released targets are unloaded
+    '''
+    def __init__(self, max_free=4):
+        self.max_free = max_free
+        self._free = []             # (key, image), least recently released first
+        self._keys = {}             # id(image) -> key, for targets in use
+        self._allocation_count = 0
+        self._reuse_count = 0
+
+    def acquire(self, width, height, content_scale=None, **kwargs):
+        '''Get a render target of the given size, either a released one or a newly created :class:`Image`.
+
+        :param width: width of the target, in texels
+        :param height: height of the target, in texels
+        :param content_scale: optional scale factor for the backing texture; defaults to
+            :attr:`Window.content_scale`
+        :param kwargs: additional keyword arguments are passed to :class:`Image`
+        :return: :class:`Image`
+        '''
+        if not content_scale:
+            content_scale = bacon.window.content_scale
+        key = (width, height, content_scale, tuple(sorted(kwargs.items())))
+        for i in range(len(self._free) - 1, -1, -1):
+            if self._free[i][0] == key:
+                image = self._free.pop(i)[1]
+                self._reuse_count += 1
+                break
+        else:
+            image = Image(width=width, height=height, content_scale=content_scale, **kwargs)
+            self._allocation_count += 1
+        self._keys[id(image)] = key
+        return image
+
+    def release(self, image):
+        '''Return a target obtained from :func:`acquire` to the pool.  It must not be used afterwards.
+
+        :param image: the target to release
+        '''
+        key = self._keys.pop(id(image), None)
+        if key is None:
+            raise ValueError('image was not acquired from this RenderTargetPool')
+        self._free.append((key, image))
+        while len(self._free) > self.max_free:
+            self._free.pop(0)[1].unload()
+
+    def clear(self):
+        '''Unload all released targets.'''
+        for key, image in self._free:
+            image.unload()
+        del self._free[:]
+
+    @property
+    def allocation_count(self):
+        '''Number of render targets created by the pool (read-only).'''
+        return self._allocation_count
+
+    @property
+    def reuse_count(self):
+        '''Number of requests satisfied by reusing a released target (read-only).'''
+        return self._reuse_count
+
+    @property
+    def in_use_count(self):
+        '''Number of targets acquired and not yet released (read-only).'''
+        return len(self._keys)
+
+    @property
+    def free_count(self):
+        '''Number of released targets kept for reuse (read-only).'''
+        return len(self._free)
+
+#: The default :class:`RenderTargetPool`.
+render_target_pool = RenderTargetPool()
@@ -517,6 +517,7 @@ def load(function_wrapper = None):
     SetBlending = fn(_lib.Bacon_SetBlending, c_int, c_int)
     DrawImage = fn(_lib.Bacon_DrawImage, c_int, c_float, c_float, c_float, c_float)
     DrawImageRegion = fn(_lib.Bacon_DrawImageRegion, c_int, c_float, c_float, c_float, c_float, c_float, c_float, c_float, c_float)
+    DrawImageQuad = fn(_lib.Bacon_DrawImageQuad, c_int, POINTER(c_float), POINTER(c_float), POINTER(c_float))
     DrawLine = fn(_lib.Bacon_DrawLine, c_float, c_float, c_float, c_float)
     DrawRect = fn(_lib.Bacon_DrawRect, c_float, c_float, c_float, c_float)
     FillRect = fn(_lib.Bacon_FillRect, c_float, c_float, c_float, c_float)
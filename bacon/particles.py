@@ -0,0 +1,214 @@
+'''Particle systems.
+
+When NumPy is installed, particle state is held in NumPy arrays, and emitting, updating and culling are
+vectorized, so their Python cost per frame does not grow with the number of particles.  Without NumPy it is
+held in lists and updated one particle at a time, which is fine for the few dozen particles of a typical
+effect.  Either way, drawing costs one native draw per particle (see :meth:`ParticleSystem.draw`).
+
+This module is not imported by ``import bacon``; import it explicitly::
+
+    import bacon.particles
+
+    dust = bacon.particles.ParticleSystem(dust_frames, lifetime=0.75)
+'''
+import random
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from bacon import graphics
+
+class ParticleSystem(object):
+    '''A pool of particles that share a lifetime and an animation.
+
+    Each particle has a position, velocity and age.  Particles are animated through ``frames`` evenly over
+    their lifetime, drawn centered on their position, and removed when their age reaches ``lifetime``.
+
+    :param frames: sequence of :class:`Image` to animate through, for example regions of a :class:`SpriteSheet`
+    :param lifetime: age, in seconds, at which particles are removed
+    :param capacity: initial number of particles to allocate storage for; storage grows as needed
+    '''
+    def __init__(self, frames, lifetime, capacity=256):
+        self._frames = list(frames)
+        self._lifetime = float(lifetime)
+        self._count = 0
+        self._half_sizes = [(f.width / 2.0, f.height / 2.0) for f in self._frames]
+        if numpy is None:
+            self._position = []
+            self._velocity = []
+            self._age = []
+            self._frame = []
+        else:
+            self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        count = self._count
+        position = numpy.zeros((capacity, 2), dtype=numpy.float32)
+        velocity = numpy.zeros((capacity, 2), dtype=numpy.float32)
+        age = numpy.zeros(capacity, dtype=numpy.float32)
+        frame = numpy.zeros(capacity, dtype=numpy.int32)
+        if count:
+            position[:count] = self.position
+            velocity[:count] = self.velocity
+            age[:count] = self.age
+            frame[:count] = self.frame
+        self._position = position
+        self._velocity = velocity
+        self._age = age
+        self._frame = frame
+
+    @property
+    def count(self):
+        '''Number of live particles (read-only).'''
+        return self._count
+
+    @property
+    def position(self):
+        '''Positions of the live particles, as an ``(count, 2)`` array, or a list of ``[x, y]`` lists without
+        NumPy.  May be modified in place.'''
+        return self._position[:self._count]
+
+    @property
+    def velocity(self):
+        '''Velocities of the live particles in units per second, as an ``(count, 2)`` array, or a list of
+        ``[vx, vy]`` lists without NumPy.  May be modified in place.'''
+        return self._velocity[:self._count]
+
+    @property
+    def age(self):
+        '''Ages of the live particles in seconds, as a ``(count,)`` array, or a list without NumPy.  May be
+        modified in place when it is an array.'''
+        return self._age[:self._count]
+
+    @property
+    def frame(self):
+        '''Index into ``frames`` of the live particles, as a ``(count,)`` array, or a list without NumPy.
+        Recomputed from the age on each :func:`update`.'''
+        return self._frame[:self._count]
+
+    def emit(self, x, y, count=1, velocity=(0, 0), spread=0):
+        '''Emit new particles at a point.
+
+        :param x: position to emit at
+        :param y: position to emit at
+        :param count: number of particles to emit
+        :param velocity: initial ``(vx, vy)`` velocity of the particles, in units per second
+        :param spread: maximum random variation added to each component of the velocity
+        '''
+        if numpy is None:
+            vx, vy = velocity
+            for i in range(count):
+                self._position.append([x, y])
+                self._velocity.append([vx + random.uniform(-spread, spread), vy + random.uniform(-spread, spread)])
+                self._age.append(0.0)
+                self._frame.append(0)
+            self._count += count
+            return
+
+        start = self._count
+        end = start + count
+        if end > len(self._age):
+            self._allocate(max(end, len(self._age) * 2))
+
+        self._position[start:end] = (x, y)
+        self._velocity[start:end] = velocity
+        if spread:
+            self._velocity[start:end] += numpy.random.uniform(-spread, spread, (count, 2))
+        self._age[start:end] = 0
+        self._frame[start:end] = 0
+        self._count = end
+
+    def update(self, dt, acceleration=None):
+        '''Advance all particles by ``dt`` seconds, and remove those that have expired.
+
+        :param dt: time step, in seconds; typically :data:`timestep`
+        :param acceleration: optional ``(ax, ay)`` acceleration applied to every particle, in units per
+            second squared
+        '''
+        count = self._count
+        if not count:
+            return
+        if numpy is None:
+            self._update_lists(dt, acceleration)
+            return
+
+        position = self._position[:count]
+        velocity = self._velocity[:count]
+        age = self._age[:count]
+        if acceleration is not None:
+            velocity += numpy.asarray(acceleration, dtype=numpy.float32) * dt
+        position += velocity * dt
+        age += dt
+
+        # Cull expired particles by compacting the survivors to the front of the arrays
+        alive = age < self._lifetime
+        survivors = int(numpy.count_nonzero(alive))
+        if survivors != count:
+            self._position[:survivors] = position[alive]
+            self._velocity[:survivors] = velocity[alive]
+            self._age[:survivors] = age[alive]
+            self._count = count = survivors
+
+        frame_count = len(self._frames)
+        frame = (self._age[:count] * (frame_count / self._lifetime)).astype(numpy.int32)
+        numpy.minimum(frame, frame_count - 1, out=self._frame[:count])
+
+    def _update_lists(self, dt, acceleration):
+        ax, ay = acceleration if acceleration is not None else (0, 0)
+        frame_count = len(self._frames)
+        position, velocity, age, frame = [], [], [], []
+        for p, v, a in zip(self._position, self._velocity, self._age):
+            a += dt
+            if a >= self._lifetime:
+                continue
+            v[0] += ax * dt
+            v[1] += ay * dt
+            p[0] += v[0] * dt
+            p[1] += v[1] * dt
+            position.append(p)
+            velocity.append(v)
+            age.append(a)
+            frame.append(min(int(a * frame_count / self._lifetime), frame_count - 1))
+        self._position = position
+        self._velocity = velocity
+        self._age = age
+        self._frame = frame
+        self._count = len(age)
+
+    def clear(self):
+        '''Remove all particles.'''
+        self._count = 0
+        if numpy is None:
+            del self._position[:], self._velocity[:], self._age[:], self._frame[:]
+
+    def draw(self):
+        '''Draw all live particles with the current color and shader.
+
+        The native library has no batched draw call, so this is one native call per particle, and its cost
+        grows linearly with the number of particles; expect some hundreds of particles per millisecond.
+        '''
+        count = self._count
+        if not count:
+            return
+        if numpy is None:
+            rects = [[] for image in self._frames]
+            for (x, y), index in zip(self._position, self._frame):
+                half_width, half_height = self._half_sizes[index]
+                rects[index].append((x - half_width, y - half_height, x + half_width, y + half_height))
+            for image, image_rects in zip(self._frames, rects):
+                if image_rects:
+                    graphics._draw_image_rects(image, image_rects)
+            return
+
+        position = self._position[:count]
+        frame = self._frame[:count]
+        for index in numpy.unique(frame):
+            image = self._frames[index]
+            centers = position[frame == index]
+            half_width, half_height = self._half_sizes[index]
+            rects = numpy.empty((len(centers), 4), dtype=numpy.float32)
+            rects[:, 0:2] = centers - (half_width, half_height)
+            rects[:, 2:4] = centers + (half_width, half_height)
+            graphics._draw_image_rects(image, rects.tolist())
@@ -1,5 +1,13 @@
+import collections
 import os
 import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 from bacon import native
 
@@ -24,4 +32,402 @@ def get_resource_path(filename):
     :param str filename: a relative path to a resource file
     :return str: an absolute path to the file
     '''
-    return os.path.join(resource_dir, filename)
\ No newline at end of file
+    return os.path.join(resource_dir, filename)
+
+class ResourceStats(object):
+    '''Counters kept by a :class:`ResourceManager`.  See :attr:`ResourceManager.stats`.
+    '''
+    def __init__(self):
+        #: Number of requests that returned an already loaded resource.
+        self.hits = 0
+        #: Number of requests that loaded a resource from disk.
+        self.misses = 0
+        #: Number of unreferenced resources unloaded to stay within the budget.
+        self.evictions = 0
+        #: Total time spent loading resources from disk, in seconds.
+        self.load_time = 0.0
+
+    def __repr__(self):
+        return 'ResourceStats(hits=%d, misses=%d, evictions=%d, load_time=%.3f)' % \
+            (self.hits, self.misses, self.evictions, self.load_time)
+
+class _Entry(object):
+    __slots__ = ('resource', 'size', 'refs')
+
+    def __init__(self, resource, size):
+        self.resource = resource
+        self.size = size
+        self.refs = 0
+
+class ResourceManager(object):
+    '''Loads images, sounds and fonts on request, sharing a single instance between all requests for the
+    same file with the same options.
+
+    Each ``load_*`` call adds a reference to the returned resource, which should be given back with
+    :func:`release` when it is no longer needed.  Unreferenced resources stay loaded, so that requesting them
+    again is free, until the total estimated size of loaded resources exceeds :attr:`budget`; then the least
+    recently released resources are unloaded first::
+
+        background = bacon.resource_manager.load_image('res/TitleScreen.png')
+        ...
+        bacon.resource_manager.release(background)
+
+    Resources still referenced are never unloaded, even if the budget is exceeded.  A resource must not be
+    used after it has been released, as it may be unloaded at any time.
+
+    The sizes used for the budget are estimates: 4 bytes per texel for images, and the file size for sounds
+    that are not streamed.  Fonts are shared but not counted against the budget.
+
+    :param budget: maximum estimated size, in bytes, of loaded resources before unreferenced ones are evicted
+    '''
+    def __init__(self, budget=64 * 1024 * 1024):
+        self._budget = budget
+        self._entries = {}                          # key -> _Entry
+        self._keys = {}                             # id(resource) -> key
+        self._unreferenced = collections.OrderedDict()  # keys with no references, least recently released first
+        self._size = 0
+        self._stats = ResourceStats()
+
+    def load_image(self, file, **kwargs):
+        '''Get a shared :class:`Image` loaded from the given file, adding a reference to it.
+
+        :param file: path to the image file
+        :param kwargs: additional keyword arguments are passed to :class:`Image`
+        :return: :class:`Image`
+        '''
+        return self._acquire('image', file, kwargs, self._create_image)
+
+    def load_sound(self, file, **kwargs):
+        '''Get a shared :class:`Sound` loaded from the given file, adding a reference to it.
+
+        :param file: path to the sound file
+        :param kwargs: additional keyword arguments are passed to :class:`Sound`
+        :return: :class:`Sound`
+        '''
+        return self._acquire('sound', file, kwargs, self._create_sound)
+
+    def load_font(self, file, size, **kwargs):
+        '''Get a shared :class:`Font` of the given file and size, adding a reference to it.
+
+        :param file: path to the font file, or ``None`` for the default font
+        :param size: size of the font, in points
+        :param kwargs: additional keyword arguments are passed to :class:`Font`
+        :return: :class:`Font`
+        '''
+        kwargs['size'] = size
+        return self._acquire('font', file, kwargs, self._create_font)
+
+    def release(self, resource):
+        '''Remove a reference to a resource returned by one of the ``load_*`` functions.  When it has no
+        references left it becomes eligible for eviction.
+
+        :param resource: the resource to release
+        '''
+        key = self._keys.get(id(resource))
+        if key is None:
+            raise ValueError('resource is not loaded by this ResourceManager')
+        entry = self._entries[key]
+        if not entry.refs:
+            raise ValueError('resource released more times than it was loaded')
+        entry.refs -= 1
+        if not entry.refs:
+            self._unreferenced[key] = entry
+            self._evict()
+
+    def clear(self):
+        '''Unload all unreferenced resources.'''
+        while self._unreferenced:
+            self._evict_oldest()
+
+    @property
+    def budget(self):
+        '''Maximum estimated size, in bytes, of loaded resources before unreferenced resources are evicted.'''
+        return self._budget
+
+    @budget.setter
+    def budget(self, budget):
+        self._budget = budget
+        self._evict()
+
+    @property
+    def size(self):
+        '''Estimated size, in bytes, of all loaded resources, referenced or not (read-only).'''
+        return self._size
+
+    @property
+    def count(self):
+        '''Number of loaded resources, referenced or not (read-only).'''
+        return len(self._entries)
+
+    @property
+    def stats(self):
+        '''Cache hit, miss, eviction and load time counters (read-only).
+
+        :type: :class:`ResourceStats`
+        '''
+        return self._stats
+
+    def _acquire(self, kind, file, kwargs, create):
+        key = (kind, file, tuple(sorted(kwargs.items())))
+        entry = self._entries.get(key)
+        if entry:
+            self._stats.hits += 1
+            if not entry.refs:
+                del self._unreferenced[key]
+        else:
+            self._stats.misses += 1
+            start = time.time()
+            resource, size = create(file, kwargs)
+            self._stats.load_time += time.time() - start
+
+            entry = _Entry(resource, size)
+            self._entries[key] = entry
+            self._keys[id(resource)] = key
+            self._size += size
+            self._evict()
+        entry.refs += 1
+        return entry.resource
+
+    def _evict(self):
+        while self._size > self._budget and self._unreferenced:
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        key, entry = self._unreferenced.popitem(last=False)
+        del self._entries[key]
+        del self._keys[id(entry.resource)]
+        self._size -= entry.size
+        self._stats.evictions += 1
+        if hasattr(entry.resource, 'unload'):
+            entry.resource.unload()
+
+    @staticmethod
+    def _create_image(file, kwargs):
+        from bacon.image import Image
+        image = Image(file, **kwargs)
+        scale = image.content_scale or 1.0
+        return image, int(image.width * scale) * int(image.height * scale) * 4
+
+    @staticmethod
+    def _create_sound(file, kwargs):
+        from bacon.sound import Sound
+        sound = Sound(file, **kwargs)
+        size = 0
+        if not kwargs.get('stream'):
+            try:
+                size = os.path.getsize(get_resource_path(file))
+            except OSError:
+                pass
+        return sound, size
+
+    @staticmethod
+    def _create_font(file, kwargs):
+        from bacon.font import Font
+        return Font(file, **kwargs), 0
+
+#: The default :class:`ResourceManager`.
+resource_manager = ResourceManager()
+
+class AssetFuture(object):
+    '''The result of a request to an :class:`AssetLoader`, which becomes available once the asset has
+    been loaded.  Results are always set on the main thread, during the game tick.
+    '''
+    def __init__(self):
+        self._done = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        '''Return ``True`` if the asset has finished loading, successfully or not.'''
+        return self._done
+
+    def result(self):
+        '''Get the loaded asset.  Raises the exception encountered while loading, if any.  This does not
+        wait for the asset to load, as loads are completed on the main thread; use :func:`add_done_callback`
+        or poll :func:`done` instead.
+        '''
+        if not self._done:
+            raise RuntimeError('asset has not finished loading')
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self):
+        '''Get the exception encountered while loading, or ``None`` if the load succeeded.'''
+        if not self._done:
+            raise RuntimeError('asset has not finished loading')
+        return self._exception
+
+    def add_done_callback(self, fn):
+        '''Call ``fn(future)`` once the asset has finished loading, or immediately if it already has.'''
+        if self._done:
+            fn(self)
+        else:
+            self._callbacks.append(fn)
+
+    def _set_result(self, result, exception=None):
+        self._result = result
+        self._exception = exception
+        self._done = True
+        callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+_active_loaders = []
+
+def _update_loaders():
+    for loader in list(_active_loaders):
+        loader.update()
+
+class AssetLoader(object):
+    '''Loads images, sounds and fonts in the background while the game runs, for example behind a title
+    or loading screen::
+
+        assets = bacon.AssetLoader()
+        background = assets.load_image('res/Background.png')
+        ...
+        if background.done():
+            bacon.draw_image(background.result(), 0, 0)
+
+    The renderer and audio device can only be used from the main thread, so each asset is decoded and
+    created on the main thread at the start of the game tick, for at most ``time_budget`` seconds each
+    frame; requests that do not fit in a frame are finished on later frames.  The pool of worker threads
+    only reads each file from the resource directory beforehand, so that it is in the OS cache and the
+    main thread does not wait on the disk.  This keeps the game responsive while loading, but decoding
+    still takes main thread time, so a large image may take a frame to itself.
+
+    Assets are created through a :class:`ResourceManager`, so they are shared with other requests for the
+    same file, and should be released with :func:`ResourceManager.release` when done.
+
+    :param manager: the :class:`ResourceManager` to load through; defaults to :data:`resource_manager`
+    :param workers: number of worker threads reading files
+    :param time_budget: maximum time, in seconds, spent creating assets each frame.  At least one asset is
+        created each frame.
+    '''
+    def __init__(self, manager=None, workers=2, time_budget=0.004):
+        if manager is None:
+            manager = resource_manager
+        self._manager = manager
+        self._worker_count = workers
+        self._workers = []
+        self._requests = queue.Queue()
+        self._ready = collections.deque()
+        self._total = 0
+        self._loaded = 0
+
+        #: Maximum time, in seconds, spent creating assets each frame.
+        self.time_budget = time_budget
+
+        #: Optional function called as ``on_progress(loaded, total)`` on the main thread each time an
+        #: asset finishes loading.
+        self.on_progress = None
+
+    def load_image(self, file, **kwargs):
+        '''Request an image; see :func:`ResourceManager.load_image`.
+
+        :return: :class:`AssetFuture` for the :class:`Image`
+        '''
+        return self._submit('image', file, kwargs)
+
+    def load_sound(self, file, **kwargs):
+        '''Request a sound; see :func:`ResourceManager.load_sound`.
+
+        :return: :class:`AssetFuture` for the :class:`Sound`
+        '''
+        return self._submit('sound', file, kwargs)
+
+    def load_font(self, file, size, **kwargs):
+        '''Request a font; see :func:`ResourceManager.load_font`.
+
+        :return: :class:`AssetFuture` for the :class:`Font`
+        '''
+        kwargs['size'] = size
+        return self._submit('font', file, kwargs)
+
+    @property
+    def loaded(self):
+        '''Number of requests that have finished loading, successfully or not (read-only).'''
+        return self._loaded
+
+    @property
+    def total(self):
+        '''Number of requests made (read-only).'''
+        return self._total
+
+    @property
+    def progress(self):
+        '''Fraction of requests that have finished loading, between 0.0 and 1.0 (read-only).'''
+        if not self._total:
+            return 1.0
+        return self._loaded / float(self._total)
+
+    @property
+    def done(self):
+        '''``True`` if all requests have finished loading (read-only).'''
+        return self._loaded == self._total
+
+    def update(self):
+        '''Create assets whose files have been read, within :attr:`time_budget`.  This is called
+        automatically at the start of each game tick, and only needs to be called directly to load assets
+        before :func:`run`.
+        '''
+        start = time.time()
+        while self._ready:
+            (kind, file, kwargs, future), exception = self._ready.popleft()
+            result = None
+            if exception is None:
+                try:
+                    result = getattr(self._manager, 'load_' + kind)(file, **kwargs)
+                except Exception as e:
+                    exception = e
+            self._loaded += 1
+            future._set_result(result, exception)
+            if self.on_progress:
+                self.on_progress(self._loaded, self._total)
+            if time.time() - start >= self.time_budget:
+                break
+
+        if self.done and self in _active_loaders:
+            _active_loaders.remove(self)
+
+    def _submit(self, kind, file, kwargs):
+        if not self._workers:
+            for i in range(self._worker_count):
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self._workers.append(thread)
+        if self not in _active_loaders:
+            _active_loaders.append(self)
+
+        future = AssetFuture()
+        self._total += 1
+        self._requests.put((kind, file, kwargs, future))
+        return future
+
+    def _work(self):
+        while True:
+            request = self._requests.get()
+            kind, file, kwargs, future = request
+            exception = None
+            if file is not None:
+                # Bring the file into the OS cache, so the native loader on the main thread does not block
+                # on it.  Decoding still happens on the main thread.
+                try:
+                    with open(get_resource_path(file), 'rb') as f:
+                        while f.read(1 << 16):
+                            pass
+                except (IOError, OSError) as e:
+                    exception = e
+            self._ready.append((request, exception))
+
+__all__ = [
+    'resource_dir',
+    'get_resource_path',
+    'ResourceStats',
+    'ResourceManager',
+    'resource_manager',
+    'AssetFuture',
+    'AssetLoader',
+]
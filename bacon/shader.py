@@ -86,6 +86,23 @@ class Shader(object):
         '''
         return self._uniforms
 
+    def set_many(self, values=None, **kwargs):
+        '''Set the values of several uniforms of this shader at once, by name::
+
+            shader.set_many(u_Tint=(1, 0, 0, 1), u_Amount=0.5)
+
+        Values equal to the uniform's current value are skipped, as for :attr:`ShaderUniform.value`.
+
+        :param values: optional dictionary of uniform name to value
+        :param kwargs: additional uniform values, by name
+        '''
+        uniforms = self._uniforms
+        if values:
+            for name, value in values.items():
+                uniforms[name]._set_value(value)
+        for name, value in kwargs.items():
+            uniforms[name]._set_value(value)
+
     @property
     def vertex_source(self):
         '''Get the vertex shader source
@@ -105,13 +122,15 @@ class Shader(object):
 class _ShaderUniformNativeType(object):
     def __init__(self, ctype, converter=None):
         self.ctype = ctype
-        if converter:
-            self.converter = converter
-        elif hasattr(ctype, '_length_'):
-            self.converter = lambda x: ctype(*x)
+        if hasattr(ctype, '_length_'):
+            self.element_ctype = ctype._type_
+            self.length = length = ctype._length_
+            # Short vectors are zero-filled by the ctype, which also rejects long ones
+            self.converter = converter or (lambda v: tuple(v) if len(v) == length else tuple(ctype(*v)))
         else:
-            self.converter = ctype
-
+            self.element_ctype = ctype
+            self.length = 1
+            self.converter = converter
 
 _shader_uniform_native_types = {
     native.ShaderUniformType.float_:    _ShaderUniformNativeType(c_float),
@@ -129,7 +148,7 @@ _shader_uniform_native_types = {
     native.ShaderUniformType.mat2:      _ShaderUniformNativeType(c_float * 4),
     native.ShaderUniformType.mat3:      _ShaderUniformNativeType(c_float * 9),
     native.ShaderUniformType.mat4:      _ShaderUniformNativeType(c_float * 16),
-    native.ShaderUniformType.sampler2D: _ShaderUniformNativeType(c_int, lambda image : c_int(image._handle))
+    native.ShaderUniformType.sampler2D: _ShaderUniformNativeType(c_int, lambda image : image._handle)
 }
 
 class ShaderUniform(object):
@@ -169,13 +188,37 @@ class ShaderUniform(object):
         except KeyError:
             raise ValueError('Unsupported shader uniform type %s' % native.ShaderUniformType.tostring(type))
 
+        # The value is converted to a number or flat tuple, which is compared with the last value sent to
+        # the renderer and copied into a buffer owned by the uniform
         if array_count > 1:
-            ctype = native_type.ctype
             converter = native_type.converter
-            self._converter = lambda v: (ctype * array_count)(*(converter(x) for x in v))
+            if native_type.length > 1:
+                self._converter = lambda v: tuple(x for element in v for x in converter(element))
+            elif converter:
+                self._converter = lambda v: tuple(converter(x) for x in v)
+            else:
+                self._converter = tuple
         else:
             self._converter = native_type.converter
-            
+
+        self._buffer = (native_type.element_ctype * (native_type.length * array_count))()
+        self._buffer_ref = byref(self._buffer)
+        self._buffer_size = sizeof(self._buffer)
+        self._scalar = len(self._buffer) == 1
+        self._native_value = None
+
+        # Values of other uniforms are written into a spare buffer and compared byte for byte with the
+        # buffer last sent, through views made once here; if they differ, the two buffers are swapped.
+        # Sequences already in the native layout are copied element by element, without a tuple.
+        if not self._scalar:
+            self._spare = self._buffer.__class__()
+            self._spare_ref = byref(self._spare)
+            self._buffer_view = self._byte_view(self._buffer)
+            self._spare_view = self._byte_view(self._spare)
+            self._element_length = native_type.length
+            self._copy_directly = native_type.converter is None
+            self._sent = False
+
     def __repr__(self):
         return 'ShaderUniform(%d, %s, %s, %d)' % (self._shader_handle, self.name, native.ShaderUniformType.tostring(self.type), self.array_count)
 
@@ -189,13 +232,59 @@ class ShaderUniform(object):
 
     def _get_value(self):
         return self._value
-    def _set_value(self, value):
-        self._value = value
-        native_value = self._converter(value)
+    @staticmethod
+    def _byte_view(buffer):
+        view = memoryview(buffer)
+        # Python 3 compares views of other formats element by element, through struct
+        return view.cast('B') if hasattr(view, 'cast') else view
+
+    def _copy_to_spare(self, value):
+        spare = self._spare
+        if self._copy_directly:
+            if self._array_count == 1 or self._element_length == 1:
+                if len(value) == len(spare):
+                    spare[:] = value
+                    return
+            elif len(value) == self._array_count:
+                length = self._element_length
+                i = 0
+                for element in value:
+                    if len(element) != length:
+                        break
+                    spare[i:i + length] = element
+                    i += length
+                else:
+                    return
+
+        native_value = self._converter(value) if self._converter else value
+        if len(native_value) == len(spare):
+            spare[:] = native_value
+        else:
+            # Short values are zero-filled, and long ones raise
+            spare[:] = type(spare)(*native_value)
+
+    def _send(self):
         if self._shader_handle is not None:
-            lib.SetShaderUniform(self._shader_handle, self._uniform_handle, byref(native_value), sizeof(native_value))
+            lib.SetShaderUniform(self._shader_handle, self._uniform_handle, self._buffer_ref, self._buffer_size)
         else:
-            lib.SetSharedShaderUniform(self._uniform_handle, byref(native_value), sizeof(native_value))
+            lib.SetSharedShaderUniform(self._uniform_handle, self._buffer_ref, self._buffer_size)
+
+    def _set_value(self, value):
+        if self._scalar:
+            native_value = self._converter(value) if self._converter else value
+            if native_value != self._native_value:
+                self._buffer[0] = native_value
+                self._send()
+                self._native_value = native_value
+        else:
+            self._copy_to_spare(value)
+            if not self._sent or self._spare_view != self._buffer_view:
+                self._buffer, self._spare = self._spare, self._buffer
+                self._buffer_ref, self._spare_ref = self._spare_ref, self._buffer_ref
+                self._buffer_view, self._spare_view = self._spare_view, self._buffer_view
+                self._send()
+                self._sent = True
+        self._value = value
     value = property(_get_value, _set_value, doc='''Current value of the uniform as seen by the shader.
 
         Uniforms with names beginning with ``g_`` (e.g., ``g_Projection``) share their value across all shaders.  Otherwise,
@@ -212,6 +301,8 @@ class ShaderUniform(object):
 
             value = ((0, 1), (2, 3), (4, 5))
 
+        The value is copied into a buffer owned by the uniform, and is not sent to the renderer again if it is equal to the
+        value last sent.
         ''')
 
     @property
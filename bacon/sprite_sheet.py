@@ -0,0 +1,96 @@
+import json
+import os
+
+from bacon import resource
+import bacon.image
+
+class SpriteSheet(object):
+    '''A single image divided into frames, each of which is an :class:`Image` region sharing the sheet's
+    texture.  Loading one sheet instead of many small images saves file opens and decodes at startup, and
+    texture binds when the frames are drawn together.
+
+    The constructor slices the sheet into a grid of equally sized frames, left to right and top to bottom::
+
+        explosion = bacon.SpriteSheet('res/Explosion.png', 64, 64)
+        bacon.draw_image(explosion[3], x, y)
+
+    Sheets whose frames differ in size are described by a JSON manifest; see :func:`load_manifest`.
+
+    :param file: path to the sheet image
+    :param frame_width: width of each frame, in texels
+    :param frame_height: height of each frame, in texels
+    :param count: optional number of frames, if the last row of the grid is not full
+    :param image_args: additional keyword arguments are passed to :class:`Image`
+    '''
+    def __init__(self, file, frame_width=None, frame_height=None, count=None, **image_args):
+        self._image = bacon.image.Image(file, **image_args)
+        self._names = {}
+        self._frames = []
+        if frame_width is None or frame_height is None:
+            return
+
+        columns = self._image.width // frame_width
+        rows = self._image.height // frame_height
+        if count is None:
+            count = columns * rows
+        for i in range(count):
+            x = (i % columns) * frame_width
+            y = (i // columns) * frame_height
+            self._frames.append(self._image.get_region(x, y, x + frame_width, y + frame_height))
+
+    @classmethod
+    def load_manifest(cls, file, **image_args):
+        '''Load a sprite sheet described by a JSON manifest, as written by ``tools/pack_sprites.py``::
+
+            {"image": "sprites.png",
+             "frames": [
+              {"name": "cat", "rect": [0, 0, 34, 40]},
+              {"name": "mouse", "rect": [34, 0, 71, 42]}
+             ]}
+
+        The image path is relative to the manifest.  Frames can be retrieved by name or by index::
+
+            sprites = bacon.SpriteSheet.load_manifest('res/sprites.json')
+            cat = sprites['cat']
+
+        :param file: path to the manifest
+        :param image_args: additional keyword arguments are passed to :class:`Image`
+        :return: :class:`SpriteSheet`
+        '''
+        with open(resource.get_resource_path(file), 'r') as f:
+            manifest = json.load(f)
+
+        image_file = os.path.join(os.path.dirname(file), manifest['image'])
+        sheet = cls(image_file, **image_args)
+        for frame in manifest['frames']:
+            x1, y1, x2, y2 = frame['rect']
+            sheet._names[frame['name']] = len(sheet._frames)
+            sheet._frames.append(sheet._image.get_region(x1, y1, x2, y2))
+        return sheet
+
+    @property
+    def image(self):
+        '''The :class:`Image` containing all frames (read-only).'''
+        return self._image
+
+    @property
+    def frames(self):
+        '''List of frames, each an :class:`Image` (read-only).'''
+        return self._frames
+
+    @property
+    def names(self):
+        '''List of frame names from the manifest, in frame order (read-only).'''
+        return sorted(self._names, key=self._names.get)
+
+    def __getitem__(self, key):
+        '''Get a frame by index, or by name if the sheet was loaded from a manifest.'''
+        if isinstance(key, int):
+            return self._frames[key]
+        return self._frames[self._names[key]]
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __iter__(self):
+        return iter(self._frames)
@@ -1,8 +1,11 @@
-import collections
+import bisect
 
 import bacon
 from bacon import native
 
+# Characters at which a line may be broken by Overflow.wrap; the break character itself is not rendered
+_break_chars = u' \u200B'
+
 class Style(object):
     def __init__(self, font, color=None, background_color=None):
         self.font = font
@@ -16,6 +19,24 @@ class GlyphRun(object):
         self.glyphs = glyphs
         self.style = style
         self.advance = sum(g.advance for g in self.glyphs)
+        self._prefix = None
+        self._breaks = None
+
+    def _get_wrap_info(self):
+        # Prefix sums of glyph advances (one longer than glyphs) and indices of break opportunities,
+        # computed once per run and reused across relayouts.
+        if self._prefix is None:
+            prefix = [0]
+            breaks = []
+            x = 0
+            for i, glyph in enumerate(self.glyphs):
+                if glyph._char in _break_chars:
+                    breaks.append(i)
+                x += glyph.advance
+                prefix.append(x)
+            self._prefix = prefix
+            self._breaks = breaks
+        return self._prefix, self._breaks
 
     def __repr__(self):
         return 'GlyphRun("%s")' % (''.join(g.char for g in self.glyphs))
@@ -54,6 +75,86 @@ class Overflow(object):
     wrap = 1
     wrap_characters = 2
 
+def _wrap(wrap_info, width, overflow, start):
+    # Greedy line breaking over runs described by (prefix, breaks) pairs, as returned by
+    # GlyphRun._get_wrap_info.  Positions are (run index, glyph index) pairs.  Yields
+    # (line_start, line_end, next_start, last_run) for each line from `start`; line_end is
+    # exclusive, next_start is None for the final line, and last_run is the last run index whose
+    # glyphs affected the choice of break (len(wrap_info) for the final line).
+    #
+    # Each line costs a binary search per run it spans, rather than a rescan of the glyphs.
+    run_count = len(wrap_info)
+    run_i, glyph_i = start
+    while run_i < run_count:
+        if glyph_i >= len(wrap_info[run_i][0]) - 1 and run_i < run_count - 1:
+            run_i += 1
+            glyph_i = 0
+            continue
+
+        # Find the first glyph extending past the right edge, which is at `limit` in the coordinates
+        # of each run's prefix sums
+        limit = wrap_info[run_i][0][glyph_i] + width
+        overflow_run = overflow_glyph = None
+        for r in range(run_i, run_count):
+            prefix = wrap_info[r][0]
+            j = bisect.bisect_right(prefix, limit) - 1
+            if j < len(prefix) - 1:
+                overflow_run, overflow_glyph = r, j
+                break
+            limit -= prefix[-1]
+
+        if overflow_run is None:
+            yield (run_i, glyph_i), (run_count - 1, len(wrap_info[-1][0]) - 1), None, run_count
+            return
+
+        line_end = next_start = None
+        if overflow == Overflow.wrap:
+            # Last break opportunity up to and including the overflowing glyph, other than the first
+            # glyph of the line.  Every glyph before the overflowing one fits.
+            for r in range(overflow_run, run_i - 1, -1):
+                breaks = wrap_info[r][1]
+                upper = overflow_glyph if r == overflow_run else len(wrap_info[r][0]) - 2
+                k = bisect.bisect_right(breaks, upper) - 1
+                if k >= 0 and (r > run_i or breaks[k] > glyph_i):
+                    line_end = (r, breaks[k])
+                    next_start = (r, breaks[k] + 1)
+                    break
+
+        if line_end is None:
+            # Break before the overflowing glyph, keeping at least one glyph on the line
+            if overflow_run == run_i:
+                line_end = next_start = (run_i, max(overflow_glyph, glyph_i + 1))
+            else:
+                line_end = next_start = (overflow_run, overflow_glyph)
+
+        # A break after the last glyph ends the text, rather than leaving an empty final line
+        r, g = next_start
+        while r < run_count and g >= len(wrap_info[r][0]) - 1:
+            r += 1
+            g = 0
+        if r == run_count:
+            yield (run_i, glyph_i), line_end, None, run_count
+            return
+
+        yield (run_i, glyph_i), line_end, next_start, overflow_run
+        run_i, glyph_i = next_start
+
+def _slice_runs(runs, start, end):
+    # Runs covering glyphs from start up to (but excluding) end; runs split by the range are copied
+    (start_run, start_glyph), (end_run, end_glyph) = start, end
+    line_runs = []
+    for r in range(start_run, end_run + 1):
+        run = runs[r]
+        a = start_glyph if r == start_run else 0
+        b = end_glyph if r == end_run else len(run.glyphs)
+        if a == 0 and b == len(run.glyphs):
+            line_runs.append(run)
+        elif b > a:
+            line_runs.append(GlyphRun(run.style, '', run.glyphs[a:b]))
+    if not line_runs:
+        line_runs.append(GlyphRun(runs[start_run].style, '', []))
+    return line_runs
+
 class GlyphLayout(object):
     '''Caches a layout of glyphs rendering a given string with bounding rectangle, layout metrics.
     '''
@@ -72,6 +173,14 @@ class GlyphLayout(object):
         self._content_height = None
         self._lines = None
 
+        # Wrapped lines from the last update, reused when only the tail of the runs has changed.
+        # Each entry is (line, next_start, last_run) where last_run is the last run index inspected
+        # when choosing the line break.
+        self._wrap_runs = None
+        self._wrap_width = None
+        self._wrap_overflow = None
+        self._wrap_lines = []
+
     def _get_runs(self):
         return self._runs
     def _set_runs(self, runs):
@@ -133,7 +242,7 @@ class GlyphLayout(object):
         if overflow != self._overflow:
             self._overflow = overflow
             self._dirty = True
-    overflow = property(_get_overflow, _set_height)
+    overflow = property(_get_overflow, _set_overflow)
 
     @property
     def lines(self):
@@ -171,74 +280,35 @@ class GlyphLayout(object):
         self._update_line_position()
 
     def _update_overflow(self):
-        remaining_runs = collections.deque(self._runs)
-        line_runs = []
-        lines = []
-        x = 0
-        while remaining_runs:
-            line_runs.append(remaining_runs.popleft())
-            x += line_runs[-1].advance
-            if x > self._width:
-                if self._overflow == Overflow.wrap:
-                    self._break_runs_word(x, line_runs, remaining_runs)
-                elif self._overflow == Overflow.wrap_characters:
-                    self._break_runs_character(x, line_runs, remaining_runs)
-                if line_runs:
-                    lines.append(GlyphLine(line_runs))
-                    line_runs = []
-                    x = 0
-
-        if line_runs:
-            lines.append(GlyphLine(line_runs))
-        self._lines = lines
-
-    def _break_runs_word(self, x, line_runs, remaining_runs):
-        # Scan backwards through each glyph in line_runs until suitable break
-        # is found.  Push remaining glyphs into remaining_runs
-        start_x = x
-        width = self._width
-        for run_i in range(len(line_runs) - 1, -1, -1):
-            run = line_runs[run_i]
-            glyphs = run.glyphs
-            for i in range(len(glyphs) - 1, -1, -1):
-                x -= glyphs[i].advance
-                if x >= width:
-                    continue
-                
-                if glyphs[i]._char in u' \u200B':
-                    if run_i != 0 or i != 0:
-                        return self._break(line_runs, remaining_runs, run_i, i, i + 1)
-
-        # No breaks found.  Repeat scan, break on character
-        self._break_runs_character(start_x, line_runs, remaining_runs)
-
-    def _break_runs_character(self, x, line_runs, remaining_runs):
-        # Scan backwards through each glyph in line_runs until suitable break
-        # is found.  Push remaining glyphs into remaining_runs
-        width = self._width
-        for run_i in range(len(line_runs) - 1, -1, -1):
-            run = line_runs[run_i]
-            glyphs = run.glyphs
-            for i in range(len(glyphs) - 1, -1, -1):
-                x -= glyphs[i].advance
-                if x >= width:
-                    continue
-
-                return self._break(line_runs, remaining_runs, run_i, i, i)
-
-    def _break(self, line_runs, remaining_runs, run_i, end_glyph_i, start_glyph_i):
-        split_run = line_runs[run_i]
-        
-        # Move entire runs to the right of run_i into remaining_runs
-        for i in range(len(line_runs) - 1, run_i, -1):
-            remaining_runs.appendleft(line_runs[i])
-        del line_runs[run_i + 1:]
-
-        # line_runs gets glyphs up to end_glyph_i of split_run
-        line_runs[-1] = GlyphRun(split_run.style, '', split_run.glyphs[:end_glyph_i])
-
-        # remaining_runs gets the right side of start_glyph_i
-        remaining_runs.appendleft(GlyphRun(split_run.style, '', split_run.glyphs[start_glyph_i:]))
+        runs = self._runs
+        wrap_lines = self._wrap_lines
+        reuse = 0
+        if (self._wrap_runs is not None and
+            self._wrap_width == self._width and
+            self._wrap_overflow == self._overflow):
+            old_runs = self._wrap_runs
+            changed = 0
+            common = min(len(old_runs), len(runs))
+            while changed < common and old_runs[changed] is runs[changed]:
+                changed += 1
+            if changed == len(old_runs) == len(runs):
+                reuse = len(wrap_lines)
+            else:
+                while reuse < len(wrap_lines) and wrap_lines[reuse][2] < changed:
+                    reuse += 1
+
+        del wrap_lines[reuse:]
+        start = wrap_lines[-1][1] if wrap_lines else (0, 0)
+        if start is not None:
+            wrap_info = [run._get_wrap_info() for run in runs]
+            for line_start, line_end, next_start, last_run in _wrap(wrap_info, self._width, self._overflow, start):
+                line = GlyphLine(_slice_runs(runs, line_start, line_end))
+                wrap_lines.append((line, next_start, last_run))
+
+        self._wrap_runs = list(runs)
+        self._wrap_width = self._width
+        self._wrap_overflow = self._overflow
+        self._lines = [line for line, _, _ in wrap_lines]
 
     def _update_line_position(self):
         if not self._lines:
@@ -336,4 +406,16 @@ def draw_glyph_layout(glyph_layout):
                 x += glyph.advance
 
     if pushed_color:
-        bacon.pop_color()
\ No newline at end of file
+        bacon.pop_color()
+
+__all__ = [
+    'Style',
+    'GlyphRun',
+    'GlyphLine',
+    'Alignment',
+    'VerticalAlignment',
+    'Overflow',
+    'GlyphLayout',
+    'draw_string',
+    'draw_glyph_layout',
+]
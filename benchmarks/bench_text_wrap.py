@@ -0,0 +1,138 @@
+'''Compares word-wrapping a long paragraph with GlyphLayout against the previous
+run-splitting implementation.
+
+Run with the native library mocked out, from the repository root::
+
+    BACON_MOCK_NATIVE=1 python benchmarks/bench_text_wrap.py
+'''
+import collections
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bacon
+from bacon.font import Glyph
+from bacon.text import GlyphLayout, GlyphLine, GlyphRun, Overflow, Style
+
+class FixedFont(object):
+    '''Stands in for a Font; every glyph has a fixed advance.'''
+    ascent = -12
+    descent = 4
+
+    def __init__(self, advance=7):
+        self._glyphs = {}
+        self._advance = advance
+
+    def get_glyphs(self, text):
+        glyphs = []
+        for c in text:
+            try:
+                glyphs.append(self._glyphs[c])
+            except KeyError:
+                glyph = self._glyphs[c] = Glyph(c, None, 0, 0, self._advance)
+                glyphs.append(glyph)
+        return glyphs
+
+class LegacyGlyphLayout(GlyphLayout):
+    '''GlyphLayout with the original overflow implementation, for reference.'''
+    def _update_overflow(self):
+        remaining_runs = collections.deque(self._runs)
+        line_runs = []
+        lines = []
+        x = 0
+        while remaining_runs:
+            line_runs.append(remaining_runs.popleft())
+            x += line_runs[-1].advance
+            if x > self._width:
+                if self._overflow == Overflow.wrap:
+                    self._break_runs_word(x, line_runs, remaining_runs)
+                elif self._overflow == Overflow.wrap_characters:
+                    self._break_runs_character(x, line_runs, remaining_runs)
+                if line_runs:
+                    lines.append(GlyphLine(line_runs))
+                    line_runs = []
+                    x = 0
+
+        if line_runs:
+            lines.append(GlyphLine(line_runs))
+        self._lines = lines
+
+    def _break_runs_word(self, x, line_runs, remaining_runs):
+        start_x = x
+        width = self._width
+        for run_i in range(len(line_runs) - 1, -1, -1):
+            glyphs = line_runs[run_i].glyphs
+            for i in range(len(glyphs) - 1, -1, -1):
+                x -= glyphs[i].advance
+                if x >= width:
+                    continue
+                if glyphs[i]._char in u' \u200B':
+                    if run_i != 0 or i != 0:
+                        return self._break(line_runs, remaining_runs, run_i, i, i + 1)
+        self._break_runs_character(start_x, line_runs, remaining_runs)
+
+    def _break_runs_character(self, x, line_runs, remaining_runs):
+        width = self._width
+        for run_i in range(len(line_runs) - 1, -1, -1):
+            glyphs = line_runs[run_i].glyphs
+            for i in range(len(glyphs) - 1, -1, -1):
+                x -= glyphs[i].advance
+                if x >= width:
+                    continue
+                return self._break(line_runs, remaining_runs, run_i, i, i)
+
+    def _break(self, line_runs, remaining_runs, run_i, end_glyph_i, start_glyph_i):
+        split_run = line_runs[run_i]
+        for i in range(len(line_runs) - 1, run_i, -1):
+            remaining_runs.appendleft(line_runs[i])
+        del line_runs[run_i + 1:]
+        line_runs[-1] = GlyphRun(split_run.style, '', split_run.glyphs[:end_glyph_i])
+        remaining_runs.appendleft(GlyphRun(split_run.style, '', split_run.glyphs[start_glyph_i:]))
+
+def make_text(length, seed=0):
+    rng = random.Random(seed)
+    words = []
+    total = 0
+    while total < length:
+        word = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(1, 10)))
+        words.append(word)
+        total += len(word) + 1
+    return ' '.join(words)[:length]
+
+def line_text(layout):
+    return [''.join(g.char for run in line.runs for g in run.glyphs) for line in layout.lines]
+
+def main():
+    style = Style(FixedFont())
+    width = 400
+    print('%8s %6s %12s %12s %12s %8s' % ('chars', 'runs', 'legacy (ms)', 'full (ms)', 'append (ms)', 'speedup'))
+    for length, run_length in ((1000, 200), (4000, 200), (16000, 200), (4000, None), (16000, None)):
+        text = make_text(length)
+        run_length = run_length or length
+        runs = [GlyphRun(style, text[i:i + run_length]) for i in range(0, len(text), run_length)]
+
+        legacy = LegacyGlyphLayout(runs, 0, 0, width)
+        layout = GlyphLayout(runs, 0, 0, width)
+        assert line_text(legacy) == line_text(layout)
+
+        def run_legacy():
+            LegacyGlyphLayout(runs, 0, 0, width).lines
+        def run_full():
+            GlyphLayout(runs, 0, 0, width).lines
+
+        # Typing at the end of the paragraph: only the trailing run changes
+        def run_append():
+            layout.runs = runs[:-1] + [GlyphRun(style, 'x ' * 20)]
+            layout.lines
+
+        repeat = 5
+        legacy_time = min(timeit.repeat(run_legacy, number=1, repeat=repeat)) * 1000
+        full_time = min(timeit.repeat(run_full, number=1, repeat=repeat)) * 1000
+        append_time = min(timeit.repeat(run_append, number=1, repeat=repeat)) * 1000
+        print('%8d %6d %12.2f %12.2f %12.2f %7.1fx' % (length, len(runs), legacy_time, full_time, append_time, legacy_time / full_time))
+
+if __name__ == '__main__':
+    main()
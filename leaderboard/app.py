@@ -1,42 +1,297 @@
+import contextlib
+import hashlib
+import json
 import os
-from flask import Flask
+from flask import Flask, jsonify, request
 from flask.ext.heroku import Heroku
 #from flask.ext.sqlalchemy import SQLAlchemy
 from sqlalchemy import *
+from sqlalchemy import exc
+
+from engine import create_engine_from_env, pool_metrics
+from rank_cache import RankCache
+from schema import scores, upsert_best_score, normalize_name, validate_row, upgrade, has_name_key_index
+from score_stats import ScoreStats
+from write_behind import WriteBehindQueue
 
 debug = True
 
 app = Flask(__name__)
 heroku = Heroku(app)
 
-db = create_engine(os.environ.get('HEROKU_POSTGRESQL_WHITE_URL', 'sqlite:///testing.db'))
+db = create_engine_from_env(os.environ.get('HEROKU_POSTGRESQL_WHITE_URL', 'sqlite:///testing.db'))
+
+# The table is created or upgraded by whichever entry point loads the app, before the caches below
+# read it: here when this file is run for development, and once by server.py or async_app.py
+if __name__ == '__main__':
+	upgrade(db)
+
+# With LEADERBOARD_BEST_SCORES=1, the table keeps only each player's best score; see migrate_best_scores.py
+best_scores = os.environ.get('LEADERBOARD_BEST_SCORES', '0') == '1'
+if best_scores and not has_name_key_index(db):
+	raise RuntimeError('LEADERBOARD_BEST_SCORES requires a compacted table; run leaderboard/migrate_best_scores.py')
+name_key = normalize_name if best_scores else None
+
+# Rows around a score, in ascending order: up to half of count below it, and the rest at or above it.
+# Both halves are keyset queries, each a seek on the (score, id) index, so the cost does not grow with rank.
+def get_neighbours(conn, score, count=6):
+	below = conn.execute(scores.select().where(scores.c.score < score) \
+		.order_by(scores.c.score.desc(), scores.c.id.desc()).limit(count // 2)).fetchall()
+	above = conn.execute(scores.select().where(scores.c.score >= score) \
+		.order_by(scores.c.score, scores.c.id).limit(count - len(below))).fetchall()
+	below.reverse()
+	return below + above
+
+def fetch_all(query):
+	# Rows of a query, read on a connection that is returned to the pool before they are used
+	with db.connect() as conn:
+		return [tuple(row) for row in conn.execute(query)]
+
+# Most rows /top returns
+top_size = int(os.environ.get('LEADERBOARD_TOP_SIZE', 100))
+
+# Neighbours, the top-N list and the score histogram behind /percentile are served from memory,
+# maintained on insert and resynced from the database periodically.  Each process, so each of
+# server.py's workers, holds its own copy of the table, about 250 bytes a row on 64-bit CPython,
+# and reads the whole table at startup and every LEADERBOARD_RESYNC_INTERVAL seconds.  Set
+# LEADERBOARD_RANK_CACHE=0 to keep no copy and answer every request from the database instead.
+rank_cache = None
+score_stats = None
+if os.environ.get('LEADERBOARD_RANK_CACHE', '1') != '0':
+	# Scores above max_score are counted exactly in the last bucket
+	score_stats = ScoreStats(
+		top_size=top_size,
+		max_score=int(os.environ.get('LEADERBOARD_MAX_SCORE', 1000000)),
+		bucket_width=int(os.environ.get('LEADERBOARD_SCORE_BUCKET', 1000)))
+	rank_cache = RankCache(lambda: fetch_all(select([scores.c.score, scores.c.id, scores.c.name])),
+		key=name_key, stats=score_stats)
+	rank_cache.resync()
+	rank_cache.start_resync(float(os.environ.get('LEADERBOARD_RESYNC_INTERVAL', 60)))
+
+@contextlib.contextmanager
+def cache_writing():
+	# Brackets a database insert and the caching of its rows; see RankCache.writing()
+	if rank_cache is None:
+		yield
+	else:
+		with rank_cache.writing():
+			yield
+
+def cache_row(score, id, name):
+	if rank_cache is not None:
+		rank_cache.add(score, id, name)
 
-metadata = MetaData(db)
-scores = Table('scores', metadata,
-	Column('id', Integer, primary_key=True),
-	Column('name', String(30)),
-	Column('score', Integer))
-metadata.create_all()
+def cache_rows(rows):
+	# Rows as (score, name), inserted without fetching their ids
+	if rank_cache is not None:
+		rank_cache.add_many(rows)
+
+def insert_rows(rows):
+	# One transaction, one executemany
+	with db.begin() as conn:
+		conn.execute(upsert_best_score if best_scores else scores.insert(), rows)
+
+def insert_and_cache_rows(rows):
+	# Rows reach the caches only once committed, so a write-behind row dropped after failing
+	# to write is never served
+	with cache_writing():
+		insert_rows(rows)
+		cache_rows([(row['score'], row['name']) for row in rows])
+
+def is_transient(error):
+	# Lock timeouts, dropped connections and pool timeouts, which may succeed if retried
+	if isinstance(error, exc.DBAPIError) and error.connection_invalidated:
+		return True
+	return isinstance(error, (exc.OperationalError, exc.TimeoutError))
+
+# With LEADERBOARD_WRITE_BEHIND=1, /add queues the row and returns before it is committed.  The row
+# is served by /get, /top and /percentile from when it is committed.
+write_behind = None
+if os.environ.get('LEADERBOARD_WRITE_BEHIND', '0') == '1':
+	write_behind = WriteBehindQueue(insert_and_cache_rows,
+		max_size=int(os.environ.get('LEADERBOARD_WRITE_BEHIND_QUEUE', 10000)),
+		batch_size=int(os.environ.get('LEADERBOARD_WRITE_BEHIND_BATCH', 500)),
+		interval=float(os.environ.get('LEADERBOARD_WRITE_BEHIND_INTERVAL', 0.5)),
+		validate=validate_row,
+		transient=is_transient,
+		retries=int(os.environ.get('LEADERBOARD_WRITE_BEHIND_RETRIES', 5)))
 
 @app.route('/')
 def hello():
 	return "HELLO!"
 
+def add_score(name, score):
+	# Raises ValueError for names and scores the table cannot hold
+	row = {'name': name, 'score': score, 'name_key': normalize_name(name)}
+	if write_behind is None:
+		validate_row(row)
+	elif write_behind.submit(row):
+		return
+
+	# Written synchronously if write-behind is off, or its queue is full
+	if best_scores:
+		insert_and_cache_rows([row])
+	else:
+		with cache_writing():
+			with db.connect() as conn:
+				r = conn.execute(scores.insert(), row)
+			cache_row(score, r.inserted_primary_key[0], name)
+
 @app.route('/add/<name>/<int:score>')
 def add(name, score):
-	r = scores.insert().execute({'name': name, 'score': score})
+	try:
+		add_score(name, score)
+	except ValueError as e:
+		return 'Invalid score: %s' % e, 400
 	return "OK"
 
-@app.route('/get/<int:score>')
-def get(score):
-	i = select([func.count()]).where(scores.c.score < score).select_from(scores).execute().scalar()
+# Maximum number of rows, and of bytes of request body, accepted by /add_batch
+max_batch_rows = int(os.environ.get('LEADERBOARD_MAX_BATCH', 1000))
+max_batch_bytes = int(os.environ.get('LEADERBOARD_MAX_BATCH_BYTES', 131072))
+
+def decode_batch(body, mimetype):
+	# JSON array, or newline-delimited JSON with one row per line
+	if mimetype in ('application/x-ndjson', 'application/ndjson'):
+		return [json.loads(line) for line in body.splitlines() if line.strip()]
+	items = json.loads(body)
+	if not isinstance(items, list):
+		raise ValueError('expected a JSON array')
+	return items
 
-	# returns a python list literal. Use ast.literal_eval to read
+def parse_batch(items):
+	# Rows are [name, score] or {"name": ..., "score": ...}, checked as /add checks them
+	rows = []
+	for i, item in enumerate(items):
+		if isinstance(item, dict):
+			name, score = item['name'], item['score']
+		else:
+			name, score = item
+		if not isinstance(name, type(u'')):
+			raise ValueError('row %d: invalid name %r' % (i, name))
+		row = {'name': name, 'score': score, 'name_key': normalize_name(name)}
+		try:
+			validate_row(row)
+		except ValueError as e:
+			raise ValueError('row %d: %s' % (i, e))
+		rows.append(row)
+	return rows
+
+@app.route('/add_batch', methods=['POST'])
+def add_batch():
+	# Oversized bodies are refused before they are read
+	if request.content_length is not None and request.content_length > max_batch_bytes:
+		return 'Batch exceeds %d bytes' % max_batch_bytes, 413
+	try:
+		items = decode_batch(request.get_data().decode('utf-8'), request.mimetype)
+	except ValueError as e:
+		return 'Invalid batch: %s' % e, 400
+	if len(items) > max_batch_rows:
+		return 'Batch exceeds %d rows' % max_batch_rows, 413
+
+	try:
+		rows = parse_batch(items)
+	except (ValueError, KeyError, TypeError) as e:
+		return 'Invalid batch: %s' % e, 400
+
+	if rows:
+		insert_and_cache_rows(rows)
+	return jsonify(added=len(rows))
+
+@app.route('/metrics')
+def metrics():
+	return jsonify(write_behind=write_behind.metrics() if write_behind is not None else None,
+		pool=pool_metrics(db))
+
+# Seconds clients and proxies may reuse a /get, /top or /percentile response
+get_max_age = int(os.environ.get('LEADERBOARD_GET_MAX_AGE', 5))
+
+def get_etag(body):
+	# Digest of a response body, so that every process serving the same data agrees on its
+	# ETag and a resync that changes nothing does not invalidate clients' copies
+	if not isinstance(body, bytes):
+		body = body.encode('utf-8')
+	return hashlib.sha1(body).hexdigest()[:20]
+
+def not_modified(etag):
+	# 304 response if the client already has this version, otherwise None
+	if etag in request.if_none_match:
+		response = app.response_class(status=304)
+		response.set_etag(etag)
+		response.cache_control.max_age = get_max_age
+		return response
+
+def cacheable(response, etag=None):
+	if etag is not None:
+		response.set_etag(etag)
+	response.cache_control.public = True
+	response.cache_control.max_age = get_max_age
+	return response
+
+@app.route('/top/<int:n>')
+def top(n):
+	# JSON array of the best n [name, score], best first
+	if n > top_size:
+		return 'At most %d rows are available' % top_size, 400
+
+	body = json.dumps(top_rows(n))
+	etag = get_etag(body)
+	response = not_modified(etag)
+	if response is not None:
+		return response
+	return cacheable(app.response_class(body, mimetype='application/json'), etag)
+
+@app.route('/percentile/<int:score>')
+def percentile(score):
+	# Share of scores lower than the given one, for "you beat X% of players"
+	below, total = count_below(score)
+	response = jsonify(score=score, below=below, total=total,
+		percentile=100.0 * below / total if total else 0.0)
+	etag = get_etag(response.get_data())
+	return not_modified(etag) or cacheable(response, etag)
+
+def top_rows(n):
+	# Best n rows as (name, score), best first, ties ranked by who got there first
+	if score_stats is not None:
+		return score_stats.top(n)
+	return [(name, score) for name, score in fetch_all(select([scores.c.name, scores.c.score]) \
+		.order_by(scores.c.score.desc(), scores.c.id).limit(n))]
+
+def count_below(score):
+	# (number of rows with a lower score, total rows)
+	if score_stats is not None:
+		return score_stats.percentile(score)
+	with db.connect() as conn:
+		below = conn.execute(select([func.count()]).where(scores.c.score < score)).scalar()
+		total = conn.execute(select([func.count()]).select_from(scores)).scalar()
+	return below, total
+
+def neighbours(score):
+	# Rows around a score as (name, score), in ascending order
+	if rank_cache is not None:
+		return rank_cache.neighbours(score)
+	with db.connect() as conn:
+		return [(row['name'], row['score']) for row in get_neighbours(conn, score)]
+
+def format_neighbours(rows, response_format):
+	# ?format=json returns a JSON array of [name, score]; otherwise a python list literal,
+	# for clients that read it with ast.literal_eval.  Returns (body, mimetype).
+	if response_format == 'json':
+		return json.dumps(rows), 'application/json'
 	v = []
-	for row in scores.select().order_by("score").offset(max(0, i-3)).limit(6).execute():
-		v.append("('%s', %d)" % (row['name'], row['score']))
+	for name, score in rows:
+		v.append("('%s', %d)" % (name, score))
+	return "[%s]" % ', '.join(v), 'text/html'
+
+@app.route('/get/<int:score>')
+def get(score):
+	response_format = request.args.get('format', 'legacy')
 
-	return "[%s]" % ', '.join(v)
+	body, mimetype = format_neighbours(neighbours(score), response_format)
+	etag = get_etag(body)
+	response = not_modified(etag)
+	if response is not None:
+		return response
+	return cacheable(app.response_class(body, mimetype=mimetype), etag)
 
 if __name__ == '__main__':
     # Bind to PORT if defined, otherwise default to 5000.
@@ -0,0 +1,89 @@
+# Cooperative leaderboard server for many concurrent keep-alive clients.  It serves app.py's Flask
+# app from gevent's WSGI server, with a greenlet rather than a thread for each connection, so
+# thousands of idle keep-alive connections cost little.  Connections are read and written by
+# greenlets, but each request is handled on a pool of real threads, so that database queries,
+# SQLite's included, block one pool thread rather than every connection.  Threads are therefore
+# left unpatched: the app's locks and background threads are real ones, as under app.py.
+#
+#   PORT=5000 python leaderboard/async_app.py
+#
+#   LEADERBOARD_MAX_CONNECTIONS    connections served at once; more wait in the backlog (10000)
+#   LEADERBOARD_BACKLOG            listen backlog (1024)
+#   LEADERBOARD_THREADS            requests handled at once (10)
+#
+# Needs gevent, which is pinned in requirements.txt for Python 2.7.
+from gevent import monkey
+monkey.patch_all(thread=False)
+
+import io
+import logging
+import os
+
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+from gevent.threadpool import ThreadPool
+
+from engine import create_engine_from_env
+from schema import upgrade
+
+def raise_file_limit():
+	# Each connection is a file descriptor; the soft limit is often far below the hard one
+	try:
+		import resource
+		soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+		resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+	except (ImportError, ValueError, OSError):
+		pass
+
+def threaded(app, pool, max_body):
+	# WSGI app that calls app on a thread from pool, while the connection's greenlet waits.  The
+	# socket belongs to this thread's hub, so the request body, and any 100 Continue it needs, is
+	# read here first.  Bodies over max_body bytes are not read: those declaring their length are
+	# left to the app to refuse, and chunked ones are refused here.
+	def call(environ, start_response):
+		try:
+			length = int(environ.get('CONTENT_LENGTH') or 0)
+		except ValueError:
+			start_response('400 Bad Request', [('Content-Type', 'text/plain')])
+			return [b'Invalid Content-Length']
+		if length > max_body:
+			body = b''
+		else:
+			body = environ['wsgi.input'].read(max_body + 1)
+			if len(body) > max_body:
+				start_response('413 Request Entity Too Large', [('Content-Type', 'text/plain')])
+				return [b'Body exceeds %d bytes' % max_body]
+			environ['CONTENT_LENGTH'] = str(len(body))
+		environ['wsgi.input'] = io.BytesIO(body)
+		return pool.apply(app, (environ, start_response))
+	return call
+
+def run(host='0.0.0.0', port=5000):
+	# Serves until interrupted
+	raise_file_limit()
+
+	# Creates or upgrades the table before the app's caches read it
+	db = create_engine_from_env(os.environ.get('HEROKU_POSTGRESQL_WHITE_URL', 'sqlite:///testing.db'))
+	upgrade(db)
+	db.dispose()
+
+	import app as leaderboard
+
+	pool = ThreadPool(int(os.environ.get('LEADERBOARD_THREADS', 10)))
+	server = WSGIServer((host, port), threaded(leaderboard.app, pool, leaderboard.max_batch_bytes),
+		backlog=int(os.environ.get('LEADERBOARD_BACKLOG', 1024)),
+		spawn=Pool(int(os.environ.get('LEADERBOARD_MAX_CONNECTIONS', 10000))),
+		log=None)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.stop()
+		pool.kill()
+		if leaderboard.write_behind is not None:
+			leaderboard.write_behind.close()
+
+if __name__ == '__main__':
+	logging.basicConfig()
+	run(port=int(os.environ.get('PORT', 5000)))
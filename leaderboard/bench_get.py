@@ -0,0 +1,62 @@
+# Compares the original /get queries on an unindexed table against the keyset
+# queries on the (score, id) index, on seeded SQLite databases of growing size.
+#
+#   python leaderboard/bench_get.py [rows ...]
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+def seed(path, rows):
+	conn = sqlite3.connect(path)
+	conn.execute('CREATE TABLE scores (id INTEGER PRIMARY KEY, name VARCHAR(30), score INTEGER)')
+	rng = random.Random(0)
+	conn.executemany('INSERT INTO scores (name, score) VALUES (?, ?)',
+		(('player%d' % i, int(rng.expovariate(1 / 5000.0))) for i in range(rows)))
+	conn.commit()
+	return conn
+
+def legacy_get(conn, score):
+	i = conn.execute('SELECT count(*) FROM scores WHERE score < ?', (score,)).fetchone()[0]
+	return conn.execute('SELECT id, name, score FROM scores ORDER BY score LIMIT 6 OFFSET ?', (max(0, i - 3),)).fetchall()
+
+def keyset_get(conn, score):
+	below = conn.execute('SELECT id, name, score FROM scores WHERE score < ? ORDER BY score DESC, id DESC LIMIT 3', (score,)).fetchall()
+	above = conn.execute('SELECT id, name, score FROM scores WHERE score >= ? ORDER BY score, id LIMIT ?', (score, 6 - len(below))).fetchall()
+	below.reverse()
+	return below + above
+
+def time_queries(fn, conn, queries):
+	times = []
+	for score in queries:
+		start = time.time()
+		fn(conn, score)
+		times.append(time.time() - start)
+	times.sort()
+	return times[len(times) // 2] * 1000, times[int(len(times) * 0.99)] * 1000
+
+def main(sizes):
+	print('%10s %14s %14s %14s %14s' % ('rows', 'legacy p50 ms', 'legacy p99 ms', 'keyset p50 ms', 'keyset p99 ms'))
+	rng = random.Random(1)
+	for rows in sizes:
+		fd, path = tempfile.mkstemp(suffix='.db')
+		os.close(fd)
+		try:
+			conn = seed(path, rows)
+			queries = [int(rng.expovariate(1 / 5000.0)) for i in range(200)]
+			legacy = time_queries(legacy_get, conn, queries[:20])
+
+			conn.execute('CREATE INDEX ix_scores_score_id ON scores (score, id)')
+			for score in queries[:20]:
+				# Scores are not unique, so compare scores rather than rows
+				assert [r[2] for r in legacy_get(conn, score)] == [r[2] for r in keyset_get(conn, score)]
+			keyset = time_queries(keyset_get, conn, queries)
+			conn.close()
+		finally:
+			os.remove(path)
+		print('%10d %14.3f %14.3f %14.3f %14.3f' % ((rows,) + legacy + keyset))
+
+if __name__ == '__main__':
+	main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
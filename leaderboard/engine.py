@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+# Checkout counts and wait times of a connection pool, for /metrics
+class PoolMetrics(object):
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._connects = 0
+		self._checkouts = 0
+		self._timeouts = 0
+		self._disconnects = 0
+		self._waits = 0
+		self._in_use = 0
+		self._max_in_use = 0
+		self._wait_time = 0.0
+		self._max_wait_time = 0.0
+
+	def connected(self):
+		with self._lock:
+			self._connects += 1
+
+	def checked_out(self):
+		with self._lock:
+			self._checkouts += 1
+			self._in_use += 1
+			self._max_in_use = max(self._max_in_use, self._in_use)
+
+	def checked_in(self):
+		with self._lock:
+			self._in_use -= 1
+
+	def disconnected(self):
+		with self._lock:
+			self._disconnects += 1
+
+	def waited(self, elapsed, timed_out=False):
+		with self._lock:
+			self._waits += 1
+			self._wait_time += elapsed
+			self._max_wait_time = max(self._max_wait_time, elapsed)
+			if timed_out:
+				self._timeouts += 1
+
+	def metrics(self):
+		with self._lock:
+			return {
+				'connects': self._connects,
+				'checkouts': self._checkouts,
+				'timeouts': self._timeouts,
+				'disconnects': self._disconnects,
+				'in_use': self._in_use,
+				'max_in_use': self._max_in_use,
+				'max_wait_ms': self._max_wait_time * 1000,
+				'mean_wait_ms': self._wait_time * 1000 / self._waits if self._waits else 0.0,
+			}
+
+# QueuePool that records how long each checkout waits for a free connection
+class MeteredQueuePool(QueuePool):
+	metrics = None
+
+	def _do_get(self):
+		start = time.time()
+		try:
+			connection = QueuePool._do_get(self)
+		except exc.TimeoutError:
+			self.metrics.waited(time.time() - start, timed_out=True)
+			raise
+		self.metrics.waited(time.time() - start)
+		return connection
+
+	def recreate(self):
+		# Called by Engine.dispose(); the new pool keeps counting into the same metrics
+		pool = QueuePool.recreate(self)
+		pool.metrics = self.metrics
+		return pool
+
+def _ping(metrics):
+	def ping(dbapi_connection, connection_record, connection_proxy):
+		# Raising DisconnectionError makes the pool discard the connection and check out another
+		cursor = None
+		try:
+			cursor = dbapi_connection.cursor()
+			cursor.execute('SELECT 1')
+		except Exception:
+			metrics.disconnected()
+			raise exc.DisconnectionError()
+		finally:
+			if cursor is not None:
+				cursor.close()
+	return ping
+
+def _sqlite_connect(busy_timeout, synchronous):
+	def connect(dbapi_connection, connection_record):
+		cursor = dbapi_connection.cursor()
+		# Readers no longer block the writer, and the writer waits for a lock rather than
+		# failing with "database is locked"
+		cursor.execute('PRAGMA journal_mode=WAL')
+		cursor.execute('PRAGMA synchronous=%s' % synchronous)
+		cursor.execute('PRAGMA busy_timeout=%d' % busy_timeout)
+		cursor.close()
+	return connect
+
+# Engine for the leaderboard database, with the pool configured from the environment:
+#
+#   LEADERBOARD_POOL_SIZE            connections kept open (5)
+#   LEADERBOARD_POOL_OVERFLOW        extra connections opened under load, closed on checkin (10)
+#   LEADERBOARD_POOL_TIMEOUT         seconds to wait for a connection before failing (30)
+#   LEADERBOARD_POOL_RECYCLE         seconds after which a connection is replaced, -1 for never (1800)
+#   LEADERBOARD_POOL_PRE_PING        1 to test connections on checkout, replacing dropped ones (1)
+#   LEADERBOARD_SQLITE_BUSY_TIMEOUT  milliseconds SQLite waits for a lock (5000)
+#   LEADERBOARD_SQLITE_SYNCHRONOUS   SQLite synchronous setting; NORMAL is durable in WAL mode
+#                                    except for the last transactions before a power loss (NORMAL)
+#
+# In-memory SQLite databases keep SQLAlchemy's default pool, since each connection would
+# otherwise see a database of its own.
+def create_engine_from_env(url):
+	url = make_url(url)
+	if url.drivername.startswith('sqlite') and url.database in (None, '', ':memory:'):
+		return create_engine(url)
+
+	kwargs = {}
+	if url.drivername.startswith('sqlite'):
+		# Connections are handed between threads by the pool, never used by two at once
+		kwargs['connect_args'] = {'check_same_thread': False}
+
+	db = create_engine(url,
+		poolclass=MeteredQueuePool,
+		pool_size=int(os.environ.get('LEADERBOARD_POOL_SIZE', 5)),
+		max_overflow=int(os.environ.get('LEADERBOARD_POOL_OVERFLOW', 10)),
+		pool_timeout=float(os.environ.get('LEADERBOARD_POOL_TIMEOUT', 30)),
+		pool_recycle=int(os.environ.get('LEADERBOARD_POOL_RECYCLE', 1800)),
+		**kwargs)
+
+	metrics = PoolMetrics()
+	db.pool.metrics = metrics
+	event.listen(db, 'connect', lambda dbapi_connection, connection_record: metrics.connected())
+	if os.environ.get('LEADERBOARD_POOL_PRE_PING', '1') == '1':
+		# Listened to first, so that a failed ping stops the checkout before it is counted
+		event.listen(db, 'checkout', _ping(metrics))
+	event.listen(db, 'checkout', lambda dbapi_connection, connection_record, connection_proxy: metrics.checked_out())
+	event.listen(db, 'checkin', lambda dbapi_connection, connection_record: metrics.checked_in())
+
+	if url.drivername.startswith('sqlite'):
+		event.listen(db, 'connect', _sqlite_connect(
+			int(os.environ.get('LEADERBOARD_SQLITE_BUSY_TIMEOUT', 5000)),
+			os.environ.get('LEADERBOARD_SQLITE_SYNCHRONOUS', 'NORMAL')))
+	return db
+
+def pool_metrics(db):
+	# Metrics of an engine made by create_engine_from_env(), or None for the default pool
+	pool = db.pool
+	if not isinstance(pool, MeteredQueuePool):
+		return None
+	metrics = pool.metrics.metrics()
+	metrics.update(size=pool.size(), checked_in=pool.checkedin(), overflow=pool.overflow())
+	return metrics
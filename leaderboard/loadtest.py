@@ -0,0 +1,102 @@
+# Measures the requests/sec and latency of running leaderboard servers, with many concurrent
+# clients each sending requests one after another on a keep-alive connection.  Most requests
+# are /get?format=json for random scores, the rest /add or a POST /add_batch of batch_size rows.
+# Clients are gevent greenlets, so thousands of them fit in one process.
+#
+# To compare the Flask app with the gevent server, on a scratch database:
+#
+#   PORT=5000 python leaderboard/app.py &
+#   PORT=5001 python leaderboard/async_app.py &
+#   python leaderboard/loadtest.py http://127.0.0.1:5000 http://127.0.0.1:5001
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import httplib
+import json
+import random
+import socket
+import sys
+import time
+from urlparse import urlsplit
+
+import gevent
+
+class Stats(object):
+	def __init__(self):
+		self.latencies = []
+		self.errors = 0
+
+	def percentile(self, p):
+		latencies = sorted(self.latencies)
+		return latencies[int(p / 100.0 * (len(latencies) - 1))] if latencies else 0.0
+
+def client(url, deadline, add_ratio, batch_ratio, batch_size, max_score, stats, rng):
+	conn = None
+	while time.time() < deadline:
+		method, body, headers = 'GET', None, {}
+		r = rng.random()
+		if r < add_ratio:
+			path = '/add/loadtest%d/%d' % (rng.randrange(100000), rng.randrange(max_score))
+		elif r < add_ratio + batch_ratio:
+			path = '/add_batch'
+			method = 'POST'
+			body = json.dumps([['loadtest%d' % rng.randrange(100000), rng.randrange(max_score)]
+				for i in range(batch_size)])
+			# As curl sends for bodies over 1KB; httplib skips the interim 100 response
+			headers = {'Content-Type': 'application/json', 'Expect': '100-continue'}
+		else:
+			path = '/get/%d?format=json' % rng.randrange(max_score)
+
+		start = time.time()
+		try:
+			if conn is None:
+				conn = httplib.HTTPConnection(url.hostname, url.port or 80)
+			conn.request(method, path, body, headers)
+			response = conn.getresponse()
+			# Read in full, so that the connection can be reused
+			response.read()
+		except (httplib.HTTPException, socket.error):
+			stats.errors += 1
+			if conn is not None:
+				conn.close()
+			conn = None
+			continue
+		stats.latencies.append(time.time() - start)
+		if response.status != 200:
+			stats.errors += 1
+		if response.will_close:
+			conn.close()
+			conn = None
+	if conn is not None:
+		conn.close()
+
+def load_test(url, connections, duration, add_ratio, batch_ratio, batch_size, max_score):
+	stats = Stats()
+	rng = random.Random(0)
+	start = time.time()
+	gevent.joinall([gevent.spawn(client, urlsplit(url), start + duration, add_ratio, batch_ratio,
+		batch_size, max_score, stats, random.Random(rng.random())) for i in range(connections)])
+	return stats, time.time() - start
+
+def main(argv):
+	parser = argparse.ArgumentParser(description='Load test leaderboard servers.')
+	parser.add_argument('-c', '--connections', type=int, default=100, help='concurrent clients (100)')
+	parser.add_argument('-d', '--duration', type=float, default=10, help='seconds per server (10)')
+	parser.add_argument('--add-ratio', type=float, default=0.1, help='share of requests that are /add (0.1)')
+	parser.add_argument('--batch-ratio', type=float, default=0.02, help='share of requests that are /add_batch (0.02)')
+	parser.add_argument('--batch-size', type=int, default=100, help='rows in each /add_batch (100)')
+	parser.add_argument('--max-score', type=int, default=10000, help='scores are drawn below this (10000)')
+	parser.add_argument('urls', nargs='+', help='base URL of each server')
+	args = parser.parse_args(argv)
+
+	print('%-28s %9s %7s %9s %9s %9s %9s' % ('server', 'requests', 'errors', 'req/s', 'p50 (ms)', 'p99 (ms)', 'max (ms)'))
+	for url in args.urls:
+		stats, elapsed = load_test(url, args.connections, args.duration, args.add_ratio, args.batch_ratio,
+			args.batch_size, args.max_score)
+		print('%-28s %9d %7d %9.0f %9.2f %9.2f %9.2f' % (url, len(stats.latencies), stats.errors,
+			len(stats.latencies) / elapsed, stats.percentile(50) * 1000, stats.percentile(99) * 1000,
+			stats.percentile(100) * 1000))
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
@@ -0,0 +1,37 @@
+# Compacts the scores table to one row per player, keeping each player's best score, and adds the
+# unique index that LEADERBOARD_BEST_SCORES=1 requires.  Players are matched by normalize_name(),
+# and of equal best scores the earliest row is kept.
+#
+#   python leaderboard/migrate_best_scores.py
+#
+# Run it with the app stopped; rows added during the migration may be lost.
+import os
+
+from sqlalchemy import *
+
+from engine import create_engine_from_env
+from schema import scores, normalize_name, upgrade, has_name_key_index, name_key_index_name
+
+def migrate(db):
+	upgrade(db)
+	if has_name_key_index(db):
+		print('Already migrated')
+		return
+
+	with db.begin() as conn:
+		rows = conn.execute(select([scores.c.id, scores.c.name])).fetchall()
+		# An executemany with no parameter sets fails, rather than doing nothing
+		if rows:
+			conn.execute(scores.update().where(scores.c.id == bindparam('row_id')).values(name_key=bindparam('key')),
+				[{'row_id': id, 'key': normalize_name(name or '')} for id, name in rows])
+
+		conn.execute('CREATE INDEX ix_scores_name_key_score ON scores (name_key, score, id)')
+		result = conn.execute('DELETE FROM scores WHERE EXISTS (SELECT 1 FROM scores AS better '
+			'WHERE better.name_key = scores.name_key AND (better.score > scores.score '
+			'OR (better.score = scores.score AND better.id < scores.id)))')
+		conn.execute('DROP INDEX ix_scores_name_key_score')
+		conn.execute('CREATE UNIQUE INDEX %s ON scores (name_key)' % name_key_index_name)
+	print('Kept %d of %d rows' % (len(rows) - result.rowcount, len(rows)))
+
+if __name__ == '__main__':
+	migrate(create_engine_from_env(os.environ.get('HEROKU_POSTGRESQL_WHITE_URL', 'sqlite:///testing.db')))
@@ -0,0 +1,306 @@
+import bisect
+import collections
+import contextlib
+import logging
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Placeholder id for entries whose row id is not known
+_unsaved_id = sys.maxsize
+
+# In-memory copy of the scores table, ordered by (score, id), answering rank and neighbour
+# queries without touching the database.
+#
+# Entries are (score, id, name) tuples kept in a list of sorted blocks, with a Fenwick tree
+# over the block lengths, so inserts and lookups are O(log n) plus a block-sized insort.
+# The database stays the source of truth: resync() reloads the whole table, and can be run
+# periodically on a background thread with start_resync().
+#
+# With a key function, the cache keeps only the best entry for each key(name), matching the
+# best-score-per-player mode of the table: adding a lower score than the player's best does
+# nothing, and a higher one replaces it.
+#
+# Writers wrap each database insert and the add that caches it in writing(), so that a resync
+# never reads a row and then finishes before the row is added, which would cache it twice.
+#
+# A ScoreStats passed as stats is kept holding the same entries: each entry added or replaced
+# is applied to it, and it is rebuilt from the cache's entries after each resync.
+class RankCache(object):
+	def __init__(self, load, block_size=512, key=None, stats=None):
+		# load() returns an iterable of (score, id, name) for every row
+		self._load = load
+		self._block_size = block_size
+		self._key = key
+		self._stats = stats
+		self._lock = threading.Lock()
+		self._pending = None
+		self._writers = 0
+		self._closing = False
+		self._idle = threading.Condition(self._lock)
+		self._build([])
+
+	def __len__(self):
+		return self._len
+
+	def _entries(self):
+		return [entry for block in self._blocks for entry in block]
+
+	def _build(self, entries):
+		size = self._block_size
+		self._blocks = [entries[i:i + size] for i in range(0, len(entries), size)]
+		self._maxes = [block[-1] for block in self._blocks]
+		self._len = len(entries)
+		self._build_tree()
+		if self._key is not None:
+			# In ascending order, so the best entry for each key is kept
+			self._best = dict((self._key(entry[2]), entry) for entry in entries)
+
+	def _build_tree(self):
+		tree = [0] * (len(self._blocks) + 1)
+		for k in range(1, len(tree)):
+			tree[k] += len(self._blocks[k - 1])
+			parent = k + (k & -k)
+			if parent < len(tree):
+				tree[parent] += tree[k]
+		self._tree = tree
+
+	def _count_before(self, block):
+		# Number of entries in blocks before the given one
+		total = 0
+		while block > 0:
+			total += self._tree[block]
+			block -= block & -block
+		return total
+
+	def _insert(self, entry):
+		blocks = self._blocks
+		if not blocks:
+			self._build([entry])
+			return
+
+		i = bisect.bisect_left(self._maxes, entry)
+		if i == len(blocks):
+			i -= 1
+		block = blocks[i]
+		bisect.insort(block, entry)
+		self._maxes[i] = block[-1]
+		self._len += 1
+
+		if len(block) > self._block_size * 2:
+			half = len(block) // 2
+			blocks[i:i + 1] = [block[:half], block[half:]]
+			self._maxes[i:i + 1] = [block[half - 1], block[-1]]
+			self._build_tree()
+		else:
+			k = i + 1
+			while k < len(self._tree):
+				self._tree[k] += 1
+				k += k & -k
+
+	def _discard(self, entry):
+		i = bisect.bisect_left(self._maxes, entry)
+		block = self._blocks[i]
+		j = bisect.bisect_left(block, entry)
+		del block[j]
+		self._len -= 1
+
+		if not block:
+			del self._blocks[i]
+			del self._maxes[i]
+			self._build_tree()
+		else:
+			self._maxes[i] = block[-1]
+			k = i + 1
+			while k < len(self._tree):
+				self._tree[k] -= 1
+				k += k & -k
+
+	def _add(self, entry, stats=None):
+		# stats, if given, is updated to match
+		if self._key is not None:
+			key = self._key(entry[2])
+			best = self._best.get(key)
+			if best is not None:
+				if best[0] >= entry[0]:
+					return
+				self._discard(best)
+				if stats is not None:
+					stats._discard(best)
+			self._best[key] = entry
+		self._insert(entry)
+		if stats is not None:
+			stats._insert(entry)
+
+	def _locate(self, score):
+		# (block, index) of the first entry with a score >= score
+		key = (score,)
+		i = bisect.bisect_left(self._maxes, key)
+		if i == len(self._blocks):
+			return i, 0
+		return i, bisect.bisect_left(self._blocks[i], key)
+
+	@contextlib.contextmanager
+	def writing(self):
+		# Brackets a database insert and the add of its rows.  Waits while a resync is merging.
+		with self._lock:
+			while self._closing:
+				self._idle.wait()
+			self._writers += 1
+		try:
+			yield
+		finally:
+			with self._lock:
+				self._writers -= 1
+				if not self._writers:
+					self._idle.notify_all()
+
+	def add(self, score, id, name):
+		entry = (score, id, name)
+		with self._lock:
+			self._add(entry, self._stats)
+			if self._pending is not None:
+				self._pending.append(entry)
+
+	def add_many(self, rows):
+		# Rows inserted without fetching their ids, as (score, name).  They sort after rows of
+		# equal score until the next resync replaces them with the stored rows.
+		with self._lock:
+			for score, name in rows:
+				entry = (score, _unsaved_id, name)
+				self._add(entry, self._stats)
+				if self._pending is not None:
+					self._pending.append(entry)
+
+	def rank(self, score):
+		# Number of entries with a lower score
+		with self._lock:
+			i, j = self._locate(score)
+			return self._count_before(i) + j
+
+	def neighbours(self, score, count=6):
+		# Same rows as app.get_neighbours, as (name, score) in ascending order
+		with self._lock:
+			blocks = self._blocks
+			i, j = self._locate(score)
+
+			below = []
+			bi, bj = i, j
+			while len(below) < count // 2:
+				if bj == 0:
+					if bi == 0:
+						break
+					bi -= 1
+					bj = len(blocks[bi])
+				bj -= 1
+				below.append(blocks[bi][bj])
+			below.reverse()
+
+			above = []
+			while len(above) < count - len(below) and i < len(blocks):
+				if j == len(blocks[i]):
+					i += 1
+					j = 0
+					continue
+				above.append(blocks[i][j])
+				j += 1
+
+		return [(name, score) for score, id, name in below + above]
+
+	def _merged(self, entries, previous, pending):
+		# Cache of the read's entries plus those added during the read that it missed.  previous is
+		# a copy of the blocks from before the read, only needed without a key.
+		merged = RankCache(self._load, self._block_size, self._key)
+		if self._key is None:
+			# Entries with ids are kept unless the read found their row.  Those without one are matched
+			# by (score, name) against rows the read found that the cache did not have, less rows that
+			# unsaved entries from before the read stand for.
+			previous_ids = set()
+			unsaved = collections.Counter()
+			for block in previous:
+				for score, id, name in block:
+					if id == _unsaved_id:
+						unsaved[score, name] += 1
+					else:
+						previous_ids.add(id)
+			for score, id, name in pending:
+				if id != _unsaved_id:
+					previous_ids.add(id)
+			found = collections.Counter((score, name) for score, id, name in entries if id not in previous_ids)
+			found.subtract(unsaved)
+
+			missing = []
+			for entry in pending:
+				score, id, name = entry
+				if id != _unsaved_id:
+					i = bisect.bisect_left(entries, entry)
+					if i < len(entries) and entries[i][:2] == entry[:2]:
+						continue
+				elif found[score, name] > 0:
+					found[score, name] -= 1
+					continue
+				missing.append(entry)
+			for entry in missing:
+				bisect.insort(entries, entry)
+			merged._build(entries)
+		else:
+			merged._build(entries)
+			for entry in pending:
+				merged._add(entry)
+		return merged
+
+	def resync(self):
+		# Entries added while the table is being read are kept, if the read missed them.  Writes
+		# in progress when the read ends are waited for, since their rows may be in the read
+		# without having been added yet.  The new contents are built without holding the lock, and
+		# entries added meanwhile are applied to them before they replace the old ones.
+		with self._lock:
+			self._pending = []
+			previous = [block[:] for block in self._blocks] if self._key is None else None
+		try:
+			entries = sorted(self._load())
+			with self._lock:
+				self._closing = True
+				while self._writers:
+					self._idle.wait()
+				self._closing = False
+				self._idle.notify_all()
+				pending = self._pending
+				self._pending = []
+			merged = self._merged(entries, previous, pending)
+			if self._stats is not None:
+				tally = self._stats._tally(merged._entries())
+		except:
+			with self._lock:
+				self._pending = None
+			raise
+
+		with self._lock:
+			late = self._pending
+			self._pending = None
+			self._blocks = merged._blocks
+			self._maxes = merged._maxes
+			self._tree = merged._tree
+			self._len = merged._len
+			if self._key is not None:
+				self._best = merged._best
+			if self._stats is not None:
+				self._stats._replace(*tally)
+			for entry in late:
+				self._add(entry, self._stats)
+
+	def start_resync(self, interval):
+		def run():
+			while True:
+				time.sleep(interval)
+				try:
+					self.resync()
+				except Exception:
+					log.exception('Rank cache resync failed')
+
+		thread = threading.Thread(target=run)
+		thread.daemon = True
+		thread.start()
+		return thread
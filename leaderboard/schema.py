@@ -0,0 +1,50 @@
+import numbers
+
+from sqlalchemy import *
+
+# Limits of the name and score columns; score is a 32-bit INTEGER on PostgreSQL
+max_name_length = 30
+max_score = 2 ** 31 - 1
+
+metadata = MetaData()
+scores = Table('scores', metadata,
+	Column('id', Integer, primary_key=True),
+	Column('name', String(max_name_length)),
+	Column('score', Integer),
+	# normalize_name(name); unique once migrate_best_scores.py has been run
+	Column('name_key', String(max_name_length)))
+score_index = Index('ix_scores_score_id', scores.c.score, scores.c.id)
+
+# Created by migrate_best_scores.py rather than create_all(), since tables that keep every
+# score have many rows per name
+name_key_index_name = 'ux_scores_name_key'
+
+# Keeps a player's best score: inserts the row, or raises the score of the row with the same name_key
+upsert_best_score = text('INSERT INTO scores (name, name_key, score) VALUES (:name, :name_key, :score) '
+	'ON CONFLICT (name_key) DO UPDATE SET name = excluded.name, score = excluded.score '
+	'WHERE excluded.score > scores.score')
+
+def normalize_name(name):
+	# Names are matched ignoring case and runs of whitespace
+	return ' '.join(name.split()).lower()[:max_name_length]
+
+def validate_row(row):
+	# Raises ValueError for a row that the scores table cannot hold
+	name, score = row['name'], row['score']
+	if len(name) > max_name_length:
+		raise ValueError('name is longer than %d characters' % max_name_length)
+	if isinstance(score, bool) or not isinstance(score, numbers.Integral) or not 0 <= score <= max_score:
+		raise ValueError('score %r is not an integer from 0 to %d' % (score, max_score))
+
+def upgrade(db):
+	# Brings an existing database up to date with the columns and indexes above, which
+	# create_all() skips for tables that already exist
+	metadata.create_all(db)
+	inspector = inspect(db)
+	if 'name_key' not in [column['name'] for column in inspector.get_columns('scores')]:
+		db.execute('ALTER TABLE scores ADD COLUMN name_key VARCHAR(30)')
+	if score_index.name not in [index['name'] for index in inspector.get_indexes('scores')]:
+		score_index.create(db)
+
+def has_name_key_index(db):
+	return name_key_index_name in [index['name'] for index in inspect(db).get_indexes('scores')]
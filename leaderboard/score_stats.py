@@ -0,0 +1,118 @@
+import bisect
+import heapq
+import threading
+
+# Score histogram and top-N list, maintained on insert, so that percentiles and the top of the
+# leaderboard are answered without sorting or counting rows.
+#
+# The histogram counts each score exactly, in a dict for each bucket of bucket_width scores that
+# holds any, with a Fenwick tree over the bucket totals; a percentile is a walk of the tree plus a
+# scan of one bucket.  Buckets cover 0 to max_score.  Scores outside that range, which /add rejects
+# but older rows may hold, are still counted exactly, in the first or last bucket.  The top list
+# keeps the best top_size rows as (-score, id, name), so ties are ranked by who got there first.
+#
+# The stats are kept in step by a RankCache, which applies each insert and removal to them and
+# rebuilds them from its own entries after each resync, so that they hold exactly the rows it does.
+class ScoreStats(object):
+	def __init__(self, top_size=100, max_score=1000000, bucket_width=1000):
+		if top_size < 1:
+			raise ValueError('top_size must be at least 1, not %r' % top_size)
+		self.top_size = top_size
+		self._bucket_width = bucket_width
+		self._bucket_count = max_score // bucket_width + 1
+		self._lock = threading.Lock()
+		self._replace(*self._tally([]))
+
+	def _bucket(self, score):
+		return min(max(score // self._bucket_width, 0), self._bucket_count - 1)
+
+	def _totals(self, buckets):
+		# Fenwick tree over the bucket totals, and the total
+		tree = [0] * (self._bucket_count + 1)
+		total = 0
+		for bucket, counts in buckets.items():
+			count = sum(counts.values())
+			tree[bucket + 1] = count
+			total += count
+		for k in range(1, len(tree)):
+			parent = k + (k & -k)
+			if parent < len(tree):
+				tree[parent] += tree[k]
+		return tree, total
+
+	def _count(self, score, delta):
+		bucket = self._bucket(score)
+		counts = self._buckets.setdefault(bucket, {})
+		count = counts.get(score, 0) + delta
+		if count:
+			counts[score] = count
+		else:
+			del counts[score]
+			if not counts:
+				del self._buckets[bucket]
+
+		k = bucket + 1
+		tree = self._tree
+		while k < len(tree):
+			tree[k] += delta
+			k += k & -k
+		self._total += delta
+
+	def _insert(self, entry):
+		# Called by the RankCache for each (score, id, name) it adds
+		score, id, name = entry
+		with self._lock:
+			self._count(score, 1)
+			top_entry = (-score, id, name)
+			top = self._top
+			if len(top) < self.top_size or top_entry < top[-1]:
+				bisect.insort(top, top_entry)
+				del top[self.top_size:]
+
+	def _discard(self, entry):
+		# Called by the RankCache for each entry it replaces.  It always adds a higher score for the
+		# same player straight after, which takes any place in the top list that this one frees.
+		score, id, name = entry
+		with self._lock:
+			self._count(score, -1)
+			top_entry = (-score, id, name)
+			i = bisect.bisect_left(self._top, top_entry)
+			if i < len(self._top) and self._top[i] == top_entry:
+				del self._top[i]
+
+	def _tally(self, entries):
+		# Histogram and top list of the given entries, for _replace().  Takes no lock, so that the
+		# RankCache can compute them from its entries after a resync before taking its own.
+		buckets = {}
+		for score, id, name in entries:
+			counts = buckets.setdefault(self._bucket(score), {})
+			counts[score] = counts.get(score, 0) + 1
+		tree, total = self._totals(buckets)
+		top = heapq.nsmallest(self.top_size, ((-score, id, name) for score, id, name in entries))
+		return buckets, tree, total, top
+
+	def _replace(self, buckets, tree, total, top):
+		with self._lock:
+			self._buckets = buckets
+			self._tree = tree
+			self._total = total
+			self._top = top
+
+	def top(self, n):
+		# Best n rows as (name, score), best first; n is limited to top_size
+		with self._lock:
+			return [(name, -score) for score, id, name in self._top[:n]]
+
+	def percentile(self, score):
+		# (number of rows with a lower score, total rows)
+		with self._lock:
+			bucket = self._bucket(score)
+			below = 0
+			k = bucket
+			while k > 0:
+				below += self._tree[k]
+				k -= k & -k
+			for s, count in self._buckets.get(bucket, {}).items():
+				if s < score:
+					below += count
+			return below, self._total
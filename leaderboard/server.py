@@ -0,0 +1,200 @@
+# Production entry point for the leaderboard: binds the listening socket, then forks worker
+# processes that accept connections from it and each serve the Flask app one request at a time.
+# Throughput scales with the number of workers, up to the number of cores.
+#
+#   PORT=5000 python leaderboard/server.py
+#
+#   LEADERBOARD_WORKERS               worker processes (number of cores)
+#   LEADERBOARD_MAX_REQUESTS          requests after which a worker is replaced, 0 for never (10000)
+#   LEADERBOARD_MAX_REQUESTS_JITTER   up to this many extra requests, so that workers are not all
+#                                     replaced at once (1000)
+#   LEADERBOARD_GRACEFUL_TIMEOUT      seconds workers get to finish on SIGTERM before being killed (30)
+#   LEADERBOARD_MAX_WORKER_FAILURES   consecutive worker failures after which the server exits, 0 for
+#                                     never (10)
+#
+# A worker fails if it exits with an error or within _min_worker_lifetime of starting, as it does
+# when the app cannot load or reach the database.  Replacements are then delayed, doubling with
+# each consecutive failure up to _max_spawn_delay, rather than forked as fast as they exit.
+#
+# The arbiter creates or upgrades the table before forking.  Each worker loads the app after the
+# fork, so has its own rank cache, score stats and write-behind queue.  They see each other's
+# inserts when they resync from the database, every LEADERBOARD_RESYNC_INTERVAL seconds; until
+# then /get may differ slightly between workers.  Each cache holds a copy of the table, so with
+# many workers on a large table, LEADERBOARD_RANK_CACHE=0 trades that memory for queries.
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import time
+
+from werkzeug.serving import make_server
+
+from engine import create_engine_from_env
+from schema import upgrade
+
+log = logging.getLogger('leaderboard.server')
+
+# Seconds a worker waits for a connection before checking whether it should stop
+_poll_interval = 1.0
+
+# Seconds between the arbiter's checks for workers to replace
+_reap_interval = 0.1
+
+# Workers that exit sooner than this many seconds after starting are counted as failures
+_min_worker_lifetime = 1.0
+
+# Longest delay, in seconds, before replacing a failed worker
+_max_spawn_delay = 30.0
+
+def run_worker(server, max_requests):
+	# Serves requests from the shared socket until SIGTERM or max_requests
+	state = {'stopping': False, 'requests': 0}
+
+	def stop(signum, frame):
+		state['stopping'] = True
+	signal.signal(signal.SIGTERM, stop)
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+	import app as leaderboard
+
+	def counting_app(environ, start_response):
+		state['requests'] += 1
+		return leaderboard.app(environ, start_response)
+	server.app = counting_app
+
+	try:
+		while not state['stopping'] and (max_requests == 0 or state['requests'] < max_requests):
+			server.handle_request()
+	finally:
+		if leaderboard.write_behind is not None:
+			leaderboard.write_behind.close()
+	log.info('Worker %d stopping after %d requests', os.getpid(), state['requests'])
+
+class Arbiter(object):
+	def __init__(self, server, workers, max_requests, max_requests_jitter, graceful_timeout,
+			max_failures):
+		self.server = server
+		self.worker_count = workers
+		self.max_requests = max_requests
+		self.max_requests_jitter = max_requests_jitter
+		self.graceful_timeout = graceful_timeout
+		self.max_failures = max_failures
+		# pid: time started
+		self.workers = {}
+		self.stopping = False
+		self.failures = 0
+		self.spawn_after = 0
+
+	def spawn(self):
+		max_requests = self.max_requests
+		if max_requests:
+			max_requests += random.randint(0, self.max_requests_jitter)
+
+		pid = os.fork()
+		if pid:
+			self.workers[pid] = time.time()
+			return
+
+		code = 0
+		try:
+			run_worker(self.server, max_requests)
+		except Exception:
+			log.exception('Worker %d failed', os.getpid())
+			code = 1
+		finally:
+			logging.shutdown()
+			# Never returns into the arbiter's loop
+			os._exit(code)
+
+	def reap(self):
+		# Removes workers that have exited; returns how many did
+		reaped = 0
+		while self.workers:
+			try:
+				pid, status = os.waitpid(-1, os.WNOHANG)
+			except OSError:
+				break
+			if pid == 0:
+				break
+			started = self.workers.pop(pid, None)
+			if started is None:
+				continue
+			reaped += 1
+
+			if status == 0 and time.time() - started >= _min_worker_lifetime:
+				self.failures = 0
+			elif not self.stopping:
+				self.failures += 1
+				delay = min(_reap_interval * 2 ** self.failures, _max_spawn_delay)
+				self.spawn_after = time.time() + delay
+				if os.WIFSIGNALED(status):
+					how = 'was killed by signal %d' % os.WTERMSIG(status)
+				else:
+					how = 'exited with status %d' % os.WEXITSTATUS(status)
+				log.warning('Worker %d %s (%d failures in a row); replacing it in %.1fs',
+					pid, how, self.failures, delay)
+		return reaped
+
+	def stop(self, signum, frame):
+		self.stopping = True
+
+	def run(self):
+		# Returns the exit status for the server
+		signal.signal(signal.SIGTERM, self.stop)
+		signal.signal(signal.SIGINT, self.stop)
+		log.info('Listening on %s:%d with %d workers', self.server.server_address[0],
+			self.server.server_address[1], self.worker_count)
+
+		status = 0
+		while not self.stopping:
+			self.reap()
+			if self.max_failures and self.failures >= self.max_failures:
+				log.error('Stopping after %d consecutive worker failures', self.failures)
+				status = 1
+				break
+			while (len(self.workers) < self.worker_count and not self.stopping and
+					time.time() >= self.spawn_after):
+				self.spawn()
+			time.sleep(_reap_interval)
+
+		# Workers finish the request in hand, flush their write-behind queues and exit
+		for pid in self.workers:
+			os.kill(pid, signal.SIGTERM)
+		deadline = time.time() + self.graceful_timeout
+		while self.workers and time.time() < deadline:
+			if not self.reap():
+				time.sleep(_reap_interval)
+		for pid in self.workers:
+			log.warning('Killing worker %d', pid)
+			os.kill(pid, signal.SIGKILL)
+		self.reap()
+		self.server.server_close()
+		return status
+
+def main():
+	logging.basicConfig(format='%(asctime)s [%(process)d] %(message)s')
+	log.setLevel(logging.INFO)
+
+	# Creates or upgrades the table once, rather than in every worker at the same time; importing
+	# app.py does not
+	db = create_engine_from_env(os.environ.get('HEROKU_POSTGRESQL_WHITE_URL', 'sqlite:///testing.db'))
+	upgrade(db)
+	db.dispose()
+
+	server = make_server('0.0.0.0', int(os.environ.get('PORT', 5000)), None)
+	# Workers wait on the socket together and only one accepts each connection.  The timeout bounds
+	# both the wait and accept(), so the others go back to waiting rather than blocking in accept(),
+	# and all of them notice SIGTERM within _poll_interval.  Accepted sockets are blocking.
+	server.socket.settimeout(_poll_interval)
+
+	sys.exit(Arbiter(server,
+		workers=int(os.environ.get('LEADERBOARD_WORKERS', multiprocessing.cpu_count())),
+		max_requests=int(os.environ.get('LEADERBOARD_MAX_REQUESTS', 10000)),
+		max_requests_jitter=int(os.environ.get('LEADERBOARD_MAX_REQUESTS_JITTER', 1000)),
+		graceful_timeout=float(os.environ.get('LEADERBOARD_GRACEFUL_TIMEOUT', 30)),
+		max_failures=int(os.environ.get('LEADERBOARD_MAX_WORKER_FAILURES', 10))).run())
+
+if __name__ == '__main__':
+	main()
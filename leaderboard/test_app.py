@@ -0,0 +1,109 @@
+# Checks the leaderboard endpoints against brute-force answers, on a scratch SQLite database
+# seeded before the app loads.  Needs the packages in requirements.txt, on Python 2.7.
+#
+#   python -m unittest discover -s leaderboard
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from sqlalchemy import select
+
+from engine import create_engine_from_env
+from schema import scores, upgrade
+
+_db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+_db_file.close()
+os.environ['HEROKU_POSTGRESQL_WHITE_URL'] = 'sqlite:///' + _db_file.name
+
+def _seed():
+	db = create_engine_from_env(os.environ['HEROKU_POSTGRESQL_WHITE_URL'])
+	upgrade(db)
+	rng = random.Random(0)
+	# Many equal scores, so that ties are ordered by id
+	db.execute(scores.insert(), [{'name': u'p%d' % i, 'name_key': u'p%d' % i, 'score': rng.randrange(200)}
+		for i in range(1000)])
+	db.dispose()
+_seed()
+
+import app
+
+def stored_rows():
+	# (score, id, name) for every row, in (score, id) order
+	with app.db.connect() as conn:
+		return sorted(tuple(row) for row in conn.execute(select([scores.c.score, scores.c.id, scores.c.name])))
+
+def expected_neighbours(rows, score, count=6):
+	below = [row for row in rows if row[0] < score][-(count // 2):]
+	above = [row for row in rows if row[0] >= score][:count - len(below)]
+	return [[name, score] for score, id, name in below + above]
+
+def tearDownModule():
+	app.db.dispose()
+	os.remove(_db_file.name)
+
+class GetTest(unittest.TestCase):
+	def setUp(self):
+		self.client = app.app.test_client()
+
+	def test_get_neighbours(self):
+		# The keyset queries, as served with LEADERBOARD_RANK_CACHE=0
+		rows = stored_rows()
+		with app.db.connect() as conn:
+			for score in list(range(-1, 202)) + [10 ** 6]:
+				self.assertEqual([[row['name'], row['score']] for row in app.get_neighbours(conn, score)],
+					expected_neighbours(rows, score))
+
+	def test_get(self):
+		rows = stored_rows()
+		for score in (0, 1, 57, 199, 200, 5000):
+			response = self.client.get('/get/%d?format=json' % score)
+			self.assertEqual(response.status_code, 200)
+			self.assertEqual(json.loads(response.data), expected_neighbours(rows, score))
+
+		legacy = self.client.get('/get/57').data
+		self.assertEqual(legacy, '[%s]' % ', '.join("('%s', %d)" % (name, score)
+			for name, score in expected_neighbours(rows, 57)))
+
+class BatchTest(unittest.TestCase):
+	# Batch rows are cached without ids, so each test uses scores no other batch uses
+	def setUp(self):
+		self.client = app.app.test_client()
+
+	def post(self, body, content_type='application/json'):
+		return self.client.post('/add_batch', data=body, content_type=content_type)
+
+	def test_add_batch(self):
+		before = len(stored_rows())
+		response = self.post(json.dumps([['b1', 1001], {'name': 'b2', 'score': 1002}, ['b3', 150]]))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(json.loads(response.data), {'added': 3})
+
+		rows = stored_rows()
+		self.assertEqual(len(rows), before + 3)
+		for score in (149, 150, 151, 1001, 1002, 1003):
+			self.assertEqual(json.loads(self.client.get('/get/%d?format=json' % score).data),
+				expected_neighbours(rows, score))
+
+	def test_add_batch_ndjson(self):
+		response = self.post('["n1", 2001]\n\n{"name": "n2", "score": 2002}\n', 'application/x-ndjson')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(json.loads(response.data), {'added': 2})
+		self.assertEqual(json.loads(self.client.get('/get/2002?format=json').data)[-2:],
+			[['n1', 2001], ['n2', 2002]])
+
+	def test_invalid_batches(self):
+		before = stored_rows()
+		for body in ('{"name": "x", "score": 1}', '[["x", -1]]', '[["x", 1.5]]', '[[1, 1]]', '[["x"]]',
+				'[{"name": "x"}]', json.dumps([['x' * 31, 1]]), '[["ok", 3001], ["x", true]]', 'not json'):
+			self.assertEqual(self.post(body).status_code, 400, body)
+		# A batch is written whole or not at all
+		self.assertEqual(stored_rows(), before)
+
+	def test_batch_limits(self):
+		self.assertEqual(self.post(json.dumps([['x', 1]] * (app.max_batch_rows + 1))).status_code, 413)
+		self.assertEqual(self.post(' ' * (app.max_batch_bytes + 1)).status_code, 413)
+
+if __name__ == '__main__':
+	unittest.main()
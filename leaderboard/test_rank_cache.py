@@ -0,0 +1,196 @@
+# Checks RankCache against brute-force answers over a plain list of rows, with and without a key,
+# including resyncs that run while other threads insert rows.
+#
+#   python -m unittest discover -s leaderboard
+import random
+import threading
+import time
+import unittest
+
+from rank_cache import RankCache
+from score_stats import ScoreStats
+
+def expected_neighbours(entries, score, count=6):
+	entries = sorted(entries)
+	below = [entry for entry in entries if entry[0] < score][-(count // 2):] if count // 2 else []
+	above = [entry for entry in entries if entry[0] >= score][:count - len(below)]
+	return [(name, score) for score, id, name in below + above]
+
+def best_entries(rows, key):
+	# The row each key keeps: its highest score, the earliest row among equal ones
+	best = {}
+	for row in rows:
+		k = key(row[2])
+		if k not in best or row[0] > best[k][0]:
+			best[k] = row
+	return sorted(best.values())
+
+class Table(object):
+	# Rows in insertion order, read by load() as a RankCache would read the database
+	def __init__(self, rows=(), delay=0):
+		self.rows = list(rows)
+		self.lock = threading.Lock()
+		self.delay = delay
+
+	def load(self):
+		with self.lock:
+			rows = list(self.rows)
+		time.sleep(self.delay)
+		return rows
+
+class RankCacheTest(unittest.TestCase):
+	def check(self, cache, entries):
+		entries = sorted(entries)
+		self.assertEqual(cache._entries(), entries)
+		self.assertEqual(len(cache), len(entries))
+		scores = [entry[0] for entry in entries]
+		for score in set(scores + [-1, 0, 1000, 1001] + [s + 1 for s in scores[:20]]):
+			self.assertEqual(cache.rank(score), sum(1 for s in scores if s < score))
+			self.assertEqual(cache.neighbours(score), expected_neighbours(entries, score))
+
+	def test_add(self):
+		rng = random.Random(0)
+		table = Table()
+		cache = RankCache(table.load, block_size=4)
+		for id in range(500):
+			row = (rng.randrange(1000), id, 'p%d' % id)
+			table.rows.append(row)
+			cache.add(*row)
+			if id % 50 == 0:
+				self.check(cache, table.rows)
+		self.check(cache, table.rows)
+		cache.resync()
+		self.check(cache, table.rows)
+
+	def test_add_with_key(self):
+		rng = random.Random(1)
+		key = lambda name: name.lower()
+		table = Table()
+		cache = RankCache(table.load, block_size=4, key=key)
+		rows = []
+		for id in range(500):
+			row = (rng.randrange(1000), id, rng.choice(['p%d', 'P%d']) % rng.randrange(60))
+			rows.append(row)
+			cache.add(*row)
+		self.check(cache, best_entries(rows, key))
+
+		table.rows = best_entries(rows, key)
+		cache.resync()
+		self.check(cache, best_entries(rows, key))
+
+	def test_resync_keeps_rows_missed_by_the_read(self):
+		table = Table([(10, 1, 'a'), (20, 2, 'b')])
+		cache = RankCache(table.load)
+		cache.resync()
+
+		# Added after the read, so the read does not find them
+		def load():
+			rows = list(table.rows)
+			cache.add(15, 3, 'c')
+			cache.add_many([(25, 'd')])
+			return rows
+		cache._load = load
+		cache.resync()
+		self.assertEqual(cache.neighbours(0), [('a', 10), ('c', 15), ('b', 20), ('d', 25)])
+
+		# Found by the next read, which replaces the unsaved entry with the stored row
+		table.rows += [(15, 3, 'c'), (25, 4, 'd')]
+		cache._load = table.load
+		cache.resync()
+		self.assertEqual(cache._entries(), sorted(table.rows))
+
+	def test_resync_matches_unsaved_rows(self):
+		table = Table([(10, 1, 'a')])
+		cache = RankCache(table.load)
+		cache.resync()
+
+		# Two equal rows inserted without ids, one before the read and one during it, both found
+		table.rows.append((30, 2, 'x'))
+		cache.add_many([(30, 'x')])
+		def load():
+			table.rows.append((30, 3, 'x'))
+			cache.add_many([(30, 'x')])
+			return list(table.rows)
+		cache._load = load
+		cache.resync()
+		self.assertEqual(cache._entries(), sorted(table.rows))
+
+	def test_resync_keeps_unsaved_rows_missed_by_the_read(self):
+		table = Table([(10, 1, 'a')])
+		cache = RankCache(table.load)
+		cache.resync()
+
+		# The read finds the row inserted before it, which the unsaved entry from before it stands
+		# for, so an equal entry added during the read is still missing
+		table.rows.append((30, 2, 'x'))
+		cache.add_many([(30, 'x')])
+		def load():
+			rows = list(table.rows)
+			table.rows.append((30, 3, 'x'))
+			cache.add_many([(30, 'x')])
+			return rows
+		cache._load = load
+		cache.resync()
+		self.assertEqual(cache.neighbours(0), [('a', 10), ('x', 30), ('x', 30)])
+
+	def resync_while_writing(self, key):
+		rng = random.Random(2)
+		table = Table(delay=0.01)
+		if key is None:
+			table.rows = [(rng.randrange(1000), id, 'p%d' % id) for id in range(1000)]
+		else:
+			table.rows = [(rng.randrange(1000), id, 'p%d' % id) for id in range(50)]
+		stats = ScoreStats(top_size=10, max_score=1000, bucket_width=100)
+		cache = RankCache(table.load, block_size=8, key=key, stats=stats)
+		cache.resync()
+
+		ids = iter(range(10000, 100000))
+		stop = threading.Event()
+		def write(seed):
+			rng = random.Random(seed)
+			while not stop.is_set():
+				with cache.writing():
+					with table.lock:
+						id = next(ids)
+						row = (rng.randrange(1000), id, 'p%d' % rng.randrange(80))
+						if key is None:
+							table.rows.append(row)
+						else:
+							# Upserted, as in best-score mode
+							old = [r for r in table.rows if r[2] == row[2]]
+							if old and old[0][0] >= row[0]:
+								row = None
+							else:
+								table.rows = [r for r in table.rows if r[2] != row[2]] + [row]
+					if row is not None:
+						if key is None and rng.random() < 0.5:
+							cache.add_many([(row[0], row[2])])
+						else:
+							cache.add(*row)
+
+		threads = [threading.Thread(target=write, args=(seed,)) for seed in range(3)]
+		for thread in threads:
+			thread.start()
+		try:
+			for i in range(5):
+				cache.resync()
+		finally:
+			stop.set()
+			for thread in threads:
+				thread.join()
+		cache.resync()
+
+		self.check(cache, table.rows)
+		below, total = stats.percentile(1000)
+		self.assertEqual(total, len(table.rows))
+		top = sorted(table.rows, key=lambda row: (-row[0], row[1]))[:10]
+		self.assertEqual(stats.top(10), [(name, score) for score, id, name in top])
+
+	def test_resync_while_writing(self):
+		self.resync_while_writing(None)
+
+	def test_resync_while_writing_with_key(self):
+		self.resync_while_writing(lambda name: name)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,58 @@
+# Checks ScoreStats' top list and percentiles against brute-force answers.
+#
+#   python -m unittest discover -s leaderboard
+import random
+import unittest
+
+from score_stats import ScoreStats
+
+class ScoreStatsTest(unittest.TestCase):
+	def check(self, stats, entries):
+		top = sorted(entries, key=lambda entry: (-entry[0], entry[1]))
+		for n in (0, 1, 5, stats.top_size):
+			self.assertEqual(stats.top(n), [(name, score) for score, id, name in top[:n]])
+		scores = [entry[0] for entry in entries]
+		for score in set(scores[:50] + [-5, 0, 1, 999, 1000, 1001, 1500]):
+			self.assertEqual(stats.percentile(score), (sum(1 for s in scores if s < score), len(scores)))
+
+	def test_insert_and_discard(self):
+		rng = random.Random(0)
+		stats = ScoreStats(top_size=10, max_score=1000, bucket_width=100)
+		entries = []
+		for id in range(1000):
+			# Some scores are outside the histogram's range, and are counted in its end buckets
+			entry = (rng.randrange(-50, 1200), id, 'p%d' % id)
+			entries.append(entry)
+			stats._insert(entry)
+			if entries and rng.random() < 0.3:
+				# As a RankCache replaces a player's entry: a removal, then a higher score straight after
+				old = entries.pop(rng.randrange(len(entries)))
+				stats._discard(old)
+				new = (old[0] + rng.randrange(1, 100), 100000 + id, old[2])
+				entries.append(new)
+				stats._insert(new)
+			if id % 100 == 0:
+				self.check(stats, entries)
+		self.check(stats, entries)
+
+	def test_replace(self):
+		rng = random.Random(1)
+		stats = ScoreStats(top_size=10, max_score=1000, bucket_width=100)
+		entries = [(rng.randrange(1000), id, 'p%d' % id) for id in range(500)]
+		stats._replace(*stats._tally(entries))
+		self.check(stats, entries)
+
+		stats._replace(*stats._tally([]))
+		self.check(stats, [])
+
+	def test_top_size(self):
+		self.assertRaises(ValueError, ScoreStats, top_size=0)
+
+		stats = ScoreStats(top_size=1)
+		stats._insert((5, 1, 'a'))
+		stats._insert((7, 2, 'b'))
+		stats._insert((7, 3, 'c'))
+		self.assertEqual(stats.top(1), [('b', 7)])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,87 @@
+# Checks that WriteBehindQueue writes every row it accepts exactly once, in batches, and contains
+# failures to the rows that cause them.
+#
+#   python -m unittest discover -s leaderboard
+import threading
+import time
+import unittest
+
+from write_behind import WriteBehindQueue
+
+class Transient(Exception):
+	pass
+
+class WriteBehindTest(unittest.TestCase):
+	def test_close_writes_accepted_rows(self):
+		# Rows submitted while the queue closes are either written or refused, never lost
+		for trial in range(10):
+			written = []
+			queue = WriteBehindQueue(written.extend, batch_size=10, interval=0.01)
+			accepted = []
+			stop = threading.Event()
+			def submit(start):
+				i = start
+				while not stop.is_set():
+					if queue.submit(i):
+						accepted.append(i)
+					i += 4
+			threads = [threading.Thread(target=submit, args=(start,)) for start in range(4)]
+			for thread in threads:
+				thread.start()
+			time.sleep(0.01)
+			queue.close()
+			stop.set()
+			for thread in threads:
+				thread.join()
+			self.assertEqual(sorted(written), sorted(accepted))
+			self.assertFalse(queue.submit(-1))
+
+	def test_batches(self):
+		batches = []
+		queue = WriteBehindQueue(batches.append, batch_size=5, interval=10)
+		for i in range(12):
+			self.assertTrue(queue.submit(i))
+		queue.close()
+		self.assertEqual([len(batch) for batch in batches], [5, 5, 2])
+		self.assertEqual([row for batch in batches for row in batch], list(range(12)))
+
+	def test_retries_transient_errors(self):
+		written = []
+		failures = [2]
+		def flush(rows):
+			if failures[0]:
+				failures[0] -= 1
+				raise Transient()
+			written.extend(rows)
+		queue = WriteBehindQueue(flush, interval=0.01, transient=lambda e: isinstance(e, Transient),
+			retry_delay=0.001)
+		for i in range(3):
+			queue.submit(i)
+		queue.close()
+		self.assertEqual(written, [0, 1, 2])
+		self.assertEqual(queue.metrics()['retried'], 2)
+
+	def test_bad_row_only_loses_itself(self):
+		written = []
+		def flush(rows):
+			if 'bad' in rows:
+				raise ValueError('bad row')
+			written.extend(rows)
+		queue = WriteBehindQueue(flush, batch_size=10, interval=10)
+		for row in ('a', 'bad', 'b'):
+			queue.submit(row)
+		queue.close()
+		self.assertEqual(written, ['a', 'b'])
+		self.assertEqual(queue.metrics()['failed'], 1)
+
+	def test_validate(self):
+		def validate(row):
+			if row < 0:
+				raise ValueError('negative')
+		queue = WriteBehindQueue(lambda rows: None, validate=validate)
+		self.assertRaises(ValueError, queue.submit, -1)
+		self.assertTrue(queue.submit(1))
+		queue.close()
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,161 @@
+import atexit
+import logging
+import threading
+import time
+
+try:
+	import queue
+except ImportError:
+	import Queue as queue
+
+log = logging.getLogger(__name__)
+
+_stop = object()
+
+# Bounded queue of rows written to the database by a background thread, so that requests
+# return without waiting for a commit.  Rows are written in batches, when batch_size rows
+# are waiting or interval seconds after the first of them arrived, whichever is sooner.
+# Queued rows are flushed when the process exits normally.
+#
+# Rows have been acknowledged by the time they are written, so failures are contained:
+# errors that transient(error) accepts, such as lock timeouts and dropped connections, are
+# retried up to retries times with doubling delays from retry_delay seconds, and a batch that
+# still fails is written row by row, so that a bad row only loses itself.
+class WriteBehindQueue(object):
+	def __init__(self, flush, max_size=10000, batch_size=500, interval=0.5,
+			validate=None, transient=None, retries=5, retry_delay=0.1):
+		# flush(rows) writes a list of rows in one transaction; validate(row) raises ValueError
+		# for rows that could never be written
+		self._flush = flush
+		self._validate = validate
+		self._transient = transient
+		self._retries = retries
+		self._retry_delay = retry_delay
+		self._queue = queue.Queue(max_size)
+		self._batch_size = batch_size
+		self._interval = interval
+		self._closed = False
+		# Held around the closed check and put in submit(), so that no row is queued after _stop
+		self._close_lock = threading.Lock()
+
+		self._metrics_lock = threading.Lock()
+		self._rejected = 0
+		self._written = 0
+		self._failed = 0
+		self._retried = 0
+		self._flushes = 0
+		self._flush_time = 0.0
+		self._last_flush_time = 0.0
+		self._max_flush_time = 0.0
+
+		self._thread = threading.Thread(target=self._run)
+		self._thread.daemon = True
+		self._thread.start()
+		atexit.register(self.close)
+
+	def submit(self, row):
+		# Returns False if the queue is full or closed, in which case the caller should write
+		# the row itself.  Raises ValueError for invalid rows, which are not queued.
+		if self._validate is not None:
+			self._validate(row)
+		with self._close_lock:
+			if not self._closed:
+				try:
+					self._queue.put_nowait(row)
+					return True
+				except queue.Full:
+					pass
+		with self._metrics_lock:
+			self._rejected += 1
+		return False
+
+	def close(self, timeout=30):
+		# Write everything queued so far and stop the worker
+		with self._close_lock:
+			if self._closed:
+				return
+			self._closed = True
+			self._queue.put(_stop)
+		self._thread.join(timeout)
+
+	def _run(self):
+		while True:
+			item = self._queue.get()
+			if item is _stop:
+				return
+			batch = [item]
+			stopping = False
+			deadline = time.time() + self._interval
+			while len(batch) < self._batch_size:
+				remaining = deadline - time.time()
+				if remaining <= 0:
+					break
+				try:
+					item = self._queue.get(timeout=remaining)
+				except queue.Empty:
+					break
+				if item is _stop:
+					stopping = True
+					break
+				batch.append(item)
+
+			self._write(batch)
+			if stopping:
+				return
+
+	def _flush_with_retries(self, rows):
+		# Raises the last error if the rows could not be written
+		delay = self._retry_delay
+		for attempt in range(self._retries + 1):
+			try:
+				self._flush(rows)
+				return
+			except Exception as e:
+				if attempt == self._retries or self._transient is None or not self._transient(e):
+					raise
+				log.warning('Write-behind flush of %d rows failed, retrying in %.1fs: %s', len(rows), delay, e)
+			with self._metrics_lock:
+				self._retried += 1
+			time.sleep(delay)
+			delay *= 2
+
+	def _write(self, batch):
+		start = time.time()
+		written = 0
+		try:
+			self._flush_with_retries(batch)
+			written = len(batch)
+		except Exception:
+			if len(batch) == 1:
+				log.exception('Write-behind flush failed, dropping %r', batch[0])
+			else:
+				log.exception('Write-behind flush of %d rows failed, writing them one at a time', len(batch))
+				for row in batch:
+					try:
+						self._flush_with_retries([row])
+						written += 1
+					except Exception:
+						log.exception('Write-behind flush failed, dropping %r', row)
+		elapsed = time.time() - start
+
+		with self._metrics_lock:
+			self._written += written
+			self._failed += len(batch) - written
+			self._flushes += 1
+			self._flush_time += elapsed
+			self._last_flush_time = elapsed
+			self._max_flush_time = max(self._max_flush_time, elapsed)
+
+	def metrics(self):
+		with self._metrics_lock:
+			return {
+				'depth': self._queue.qsize(),
+				'rejected': self._rejected,
+				'written': self._written,
+				'failed': self._failed,
+				'retried': self._retried,
+				'flushes': self._flushes,
+				'last_flush_ms': self._last_flush_time * 1000,
+				'max_flush_ms': self._max_flush_time * 1000,
+				'mean_flush_ms': self._flush_time * 1000 / self._flushes if self._flushes else 0.0,
+			}
@@ -1,7 +1,10 @@
-import ast
+import json
+import logging
 import sys
+import array
 import math
 import bacon
+import bacon.particles
 import string
 import random
 import urllib
@@ -47,31 +50,48 @@ LEADERBOARD_SERVER = "enigmatic-bayou-2555.herokuapp.com"
 
 bacon.window.resizable = True
 #bacon.window.fullscreen = True
-bacon.window.target = bacon.Image(width=1920, height=1200, atlas=0)
+bacon.window.target = bacon.render_target_pool.acquire(1920, 1200, atlas=0)
 bacon.window.width = 1024
 bacon.window.height = 768
 
+# Built from the loose sprites with tools/pack_sprites.py
+sprites = bacon.SpriteSheet.load_manifest('res/sprites.json')
+
 textures = {
-    'catapult_frame': bacon.Image('res/catapultframe.png'),
-    'catapult_spoon': bacon.Image('res/spoon.png'),
-    'earth': bacon.Image('res/earth.png'),
-    'mouse': bacon.Image('res/mouse.png'),
-    'moon': bacon.Image('res/moon.png'),
-    'cat': bacon.Image('res/cat.png'),
-    'background': bacon.Image('res/BG.png')
+    'catapult_frame': sprites['catapultframe'],
+    'catapult_spoon': sprites['spoon'],
+    'earth': sprites['earth'],
+    'mouse': sprites['mouse'],
+    'moon': sprites['moon'],
+    'cat': sprites['cat'],
 }
 
-clouds = [bacon.Image('res/Dust%d.png' % i) for i in range(1, 9)]
+clouds = [sprites['Dust%d' % i] for i in range(1, 9)]
 
-sounds = {
-    'squeak': bacon.Sound('res/squeak.wav'),
-    'explosion': bacon.Sound('res/explosion.wav'),
-    'catapult': bacon.Sound('res/catapult.wav'),
-    'thud0': bacon.Sound('res/thud0.wav'),
-    'thud1': bacon.Sound('res/thud1.wav'),
-    'fight': bacon.Sound('res/fight.wav'),
-    'omnomnom': bacon.Sound('res/omnomnom.wav'),
-}
+sounds = {}
+
+# Assets not needed by the title screen load in the background while it is shown
+assets = bacon.AssetLoader()
+
+class Silence(object):
+    # Stands in for a sound that failed to load
+    def play(self, gain=None, pan=None, pitch=None):
+        pass
+
+def store_asset(table, key, fallback):
+    # A missing asset shouldn't stop the game, so failures are logged and the fallback stored instead
+    def callback(future):
+        if future.exception() is None:
+            table[key] = future.result()
+        else:
+            logging.error('Unable to load %s: %s', key, future.exception())
+            table[key] = fallback
+    return callback
+
+# Without the background, the screen is left at its clear color
+assets.load_image('res/BG.png').add_done_callback(store_asset(textures, 'background', None))
+for name in ('squeak', 'explosion', 'catapult', 'thud0', 'thud1', 'fight', 'omnomnom'):
+    assets.load_sound('res/%s.wav' % name).add_done_callback(store_asset(sounds, name, Silence()))
 
 moon_eated_states = [100, 75, 50, 25, 15, 5]
 
@@ -79,6 +99,25 @@ font_16 = bacon.Font(None, 16)
 font_24 = bacon.Font(None, 24)
 font_72 = bacon.Font(None, 72)
 
+# Rasterized a few glyphs a frame behind the title screen's loading bar, so the game over screen
+# and name entry don't stall
+fonts_to_prewarm = [(font_16, {}), (font_24, {}), (font_72, {'charset': 'GAME OVER'})]
+font_prewarm_count = len(fonts_to_prewarm)
+
+def prewarm_fonts(max_glyphs=8):
+    # True once every font is prewarmed
+    while fonts_to_prewarm:
+        font, kwargs = fonts_to_prewarm[0]
+        if not font.prewarm(max_glyphs=max_glyphs, **kwargs):
+            return False
+        del fonts_to_prewarm[0]
+    return True
+
+def loading_progress():
+    # Share of the assets and fonts loaded, from 0 to 1
+    fonts_done = font_prewarm_count - len(fonts_to_prewarm)
+    return (assets.progress + float(fonts_done) / font_prewarm_count) / 2
+
 def clamp(v, a, b):
     return min(b, max(a, v))
 
@@ -105,12 +144,7 @@ class Sprite(object):
 
     def draw(self):
         ox, oy = self.image.width / 2, self.image.height / 2
-
-        bacon.push_transform()
-        bacon.translate(self.pos.x, self.pos.y)
-        bacon.rotate(self.rotation)
-        bacon.draw_image(self.image, -ox, -oy)
-        bacon.pop_transform()
+        bacon.draw_image_transformed(self.image, self.pos.x, self.pos.y, self.rotation, origin_x=ox, origin_y=oy)
 
 class RoundSprite(Sprite):
     def __init__(self, pos, image, rotation=0):
@@ -171,7 +205,7 @@ class Moon(RoundSprite):
     def take_damage(self, amount):
         for v in moon_eated_states:
             if self.health > v / 100.0:
-                self.image = bacon.Image('res/moon%d.png' % v)
+                self.image = sprites['moon%d' % v]
                 self.health = v / 100.0
                 break
         else:
@@ -269,11 +303,8 @@ class Catapult(Sprite):
 
     def draw_image(self, img, pos, sc):
         ox, oy = img.width / 2, img.height / 2
-        bacon.push_transform()
-        bacon.translate(pos.x, pos.y)
-        bacon.rotate(self.angle)
-        bacon.draw_image(img, sc.x*ox, sc.y*oy)
-        bacon.pop_transform()
+        bacon.draw_image_transformed(img, pos.x, pos.y, self.angle,
+            origin_x=-sc.x*ox, origin_y=-sc.y*oy)
 
     def draw(self):
         super(Catapult, self).draw()
@@ -353,35 +384,20 @@ class CatSpawner(object):
             if cat.collides_with(f_moon) or cat.collides_with(earth):
                 break
         
-        bacon.push_color()
+        points = array.array('f')
+        colors = array.array('f')
         c = 0.4
-        for i in range(1, len(v)):
-            bacon.set_color(c, c, c, 0)
-            bacon.draw_line(v[i].x, v[i].y, v[i-1].x, v[i-1].y)
+        for p in v:
+            points.extend((p.x, p.y))
+            colors.extend((c, c, c, 0))
             c -= 0.4 * (1.0 / TOTAL_STEPS)
-        bacon.pop_color()
-
-class Cloud(Sprite):
-    def __init__(self, pos):
-        super(Cloud, self).__init__(pos, clouds[0])
-        self.life = CLOUD_LIFETIME
-        self.dead = False
-        sounds['fight'].play()
-
-    def on_tick(self):
-        self.life -= bacon.timestep
-        
-        i = (len(clouds)-1) * (CLOUD_LIFETIME - self.life) / float(CLOUD_LIFETIME)
-        self.image = clouds[int(i)]
-
-        if self.life < 0:
-            self.dead = True
+        bacon.draw_line_strip(points, colors)
 
 class Game(bacon.Game):
     def __init__(self):
         self.cats = []
         self.mice = []
-        self.clouds = []
+        self.clouds = bacon.particles.ParticleSystem(clouds, CLOUD_LIFETIME)
         self.down = False
         self.spawn_timer = MOUSE_INITIAL_SPAWN_DELAY
         self.cat_spawner = CatSpawner()
@@ -420,13 +436,13 @@ class Game(bacon.Game):
                 if cat.collides_with(mouse):
                     cat.dead = True
                     mouse.dead = True
-                    self.clouds.append(Cloud(mouse.pos))
+                    self.clouds.emit(mouse.pos.x, mouse.pos.y)
+                    sounds['fight'].play()
                     sounds['explosion'].play()
                     self.score += 5 + 3*clamp(cat.lifetime - 1, 0, 5)
 
         self.cats[:] = [c for c in self.cats if not c.dead]
         self.mice[:] = [m for m in self.mice if not m.dead]
-        self.clouds[:] = [c for c in self.clouds if not c.dead]
 
     def find_mouse_spawn(self):
         i = random.uniform(0, 2*WINDOW_WIDTH + 2*WINDOW_HEIGHT-1)
@@ -442,7 +458,8 @@ class Game(bacon.Game):
     def on_tick(self):
         bacon.clear(12/255.0, 20/255.0, 53/255.0, 0)
 
-        bacon.draw_image(textures['background'], 0,0)
+        if textures['background']:
+            bacon.draw_image(textures['background'], 0,0)
         bacon.draw_string(font_24, 'Score: %d' % self.score,
             x=WINDOW_WIDTH/2, y=0,
             align=bacon.Alignment.center,
@@ -459,8 +476,7 @@ class Game(bacon.Game):
             cat.draw()
         for mouse in self.mice:
             mouse.draw()
-        for cloud in self.clouds:
-            cloud.draw()
+        self.clouds.draw()
         earth.draw()
         moon.draw()
         catapult.draw()
@@ -491,29 +507,40 @@ class Game(bacon.Game):
             cat.on_tick()
         for mouse in self.mice:
             mouse.on_tick()
-        for cloud in self.clouds:
-            cloud.on_tick()
+        self.clouds.update(bacon.timestep)
 
         catapult.on_tick()
         self.cat_spawner.on_tick(self)
 
 class TitleScreen(bacon.Game):
     def __init__(self):
-        self.background = bacon.Image('res/TitleScreen.png')
+        self.background = bacon.resource_manager.load_image('res/TitleScreen.png')
         self.t = 1.0
         self.help = False
         self.fadeout = False
+        self.loaded = False
+        self.start_pending = False
 
     def display_next(self):
         if not self.help:
-            self.background = bacon.Image('res/IntroScreen.png')
+            bacon.resource_manager.release(self.background)
+            self.background = bacon.resource_manager.load_image('res/IntroScreen.png')
             self.help = True
         elif not self.fadeout:
             self.fadeout = True
+        elif not self.loaded:
+            # Started from on_tick once loading finishes
+            self.start_pending = True
+            return
         else:
-            scene.game = Game()
+            self.start_game()
+            return
         self.t = 0
 
+    def start_game(self):
+        bacon.resource_manager.release(self.background)
+        scene.game = Game()
+
     def on_key(self, key, value):
         self.display_next()
         handle_standard_keys(key, value)
@@ -522,11 +549,22 @@ class TitleScreen(bacon.Game):
         self.display_next()
 
     def on_tick(self):
+        if not self.loaded:
+            self.loaded = prewarm_fonts() and assets.done
+            if self.loaded and self.start_pending:
+                # The game draws this frame in place of the title screen
+                self.start_game()
+                scene.game.on_tick()
+                return
+
         bacon.draw_image(self.background, 0, 0)
  
         bacon.push_color()
         bacon.set_color(0,0,0, smoothstep(1.0 - self.t))
         bacon.fill_rect(0,0, WINDOW_WIDTH, WINDOW_HEIGHT)
+        if not self.loaded:
+            bacon.set_color(1, 1, 1, 0.5)
+            bacon.fill_rect(0, WINDOW_HEIGHT - 4, WINDOW_WIDTH * loading_progress(), WINDOW_HEIGHT)
         bacon.pop_color()
 
         if self.t < 1.0:
@@ -558,9 +596,10 @@ class GameOverScreen(bacon.Game):
     def on_tick(self):
         bacon.clear(0,0,0,0)
 
-        if self.fade_image is None:
-            self.fade_image = bacon.Image(width = WINDOW_WIDTH, height = WINDOW_HEIGHT)
+        if self.state == "fade-in" and self.fade_image is None:
+            self.fade_image = bacon.render_target_pool.acquire(WINDOW_WIDTH, WINDOW_HEIGHT)
             bacon.push_target(self.fade_image)
+            bacon.clear(0,0,0,0)
             self.game.on_tick()
             bacon.pop_target()
 
@@ -570,7 +609,8 @@ class GameOverScreen(bacon.Game):
             self.y += self.yvel
 
             bacon.push_color()
-            bacon.draw_image(textures['background'], 0, self.y - WINDOW_HEIGHT)
+            if textures['background']:
+                bacon.draw_image(textures['background'], 0, self.y - WINDOW_HEIGHT)
             bacon.pop_color()
 
             bacon.draw_image(self.fade_image, 0, self.y)
@@ -583,6 +623,8 @@ class GameOverScreen(bacon.Game):
             if self.t > 1:
                 self.state = "pre-game-over"
                 self.t = GAME_OVER_AFTERFADE_WAIT
+                bacon.render_target_pool.release(self.fade_image)
+                self.fade_image = None
 
         elif self.state == "pre-game-over":
             self.t -= bacon.timestep
@@ -680,10 +722,10 @@ class GameOverScreen(bacon.Game):
         def background(_self, self_game_score):
             try:
                 conn = httplib.HTTPConnection(LEADERBOARD_SERVER)
-                conn.request("GET", "/get/%d" % self.game.score)
+                conn.request("GET", "/get/%d?format=json" % self.game.score)
                 r = conn.getresponse()
                 if r.status == 200:
-                    _self.stats = ast.literal_eval(r.read())
+                    _self.stats = json.loads(r.read())
                     index = 0
                     for i, (_,score) in enumerate(self.stats):
                         if self_game_score >= score:
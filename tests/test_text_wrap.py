@@ -0,0 +1,116 @@
+'''Checks GlyphLayout's line wrapping on randomized text: every glyph is laid out once and in order,
+and lines fit the layout width.
+
+Run with the native library mocked out, from the repository root::
+
+    BACON_MOCK_NATIVE=1 python -m unittest discover -s tests
+'''
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('BACON_MOCK_NATIVE', '1')
+
+import bacon
+from bacon.font import Glyph
+from bacon.text import GlyphLayout, GlyphRun, Overflow, Style
+
+class VariableFont(object):
+    '''Stands in for a Font; each character has its own fixed advance.'''
+    ascent = -12
+    descent = 4
+
+    def __init__(self, advances):
+        self._advances = advances
+
+    def get_glyphs(self, text):
+        # A new Glyph for each character, so that the checks can tell glyphs apart by identity
+        return [Glyph(c, None, 0, 0, self._advances[c]) for c in text]
+
+_chars = u'abcdefghij \u200B'
+
+def make_font(rng):
+    return VariableFont(dict((c, rng.randint(0, 12)) for c in _chars))
+
+def make_runs(rng, style):
+    text = u''.join(rng.choice(_chars) if rng.random() < 0.3 else rng.choice(u'abcdefghij')
+        for _ in range(rng.randint(1, 120)))
+    runs = []
+    i = 0
+    while i < len(text):
+        n = rng.randint(1, 30)
+        runs.append(GlyphRun(style, text[i:i + n]))
+        i += n
+    return runs
+
+def line_glyphs(line):
+    return [glyph for run in line.runs for glyph in run.glyphs]
+
+class WrapTest(unittest.TestCase):
+    def check_layout(self, runs, width, overflow):
+        layout = GlyphLayout(runs, 0, 0, width, overflow=overflow)
+        glyphs = [glyph for run in runs for glyph in run.glyphs]
+        lines = [line_glyphs(line) for line in layout.lines]
+
+        # Lines hold the glyphs in order; between lines, word wrapping drops the break character
+        for line in lines:
+            self.assertTrue(line)
+        i = 0
+        for n, line in enumerate(lines):
+            if n > 0 and overflow == Overflow.wrap and glyphs[i] is not line[0]:
+                self.assertIn(glyphs[i].char, u' \u200B')
+                i += 1
+            self.assertEqual(line, glyphs[i:i + len(line)])
+            i += len(line)
+        if overflow == Overflow.wrap and i == len(glyphs) - 1:
+            # Breaking at a final space drops it
+            self.assertIn(glyphs[i].char, u' \u200B')
+            i += 1
+        self.assertEqual(i, len(glyphs))
+
+        # Lines fit, unless a single glyph is wider than the layout
+        for line in lines:
+            if len(line) > 1:
+                self.assertLessEqual(sum(glyph.advance for glyph in line), width)
+
+        if overflow == Overflow.wrap_characters:
+            # Each line but the last is as long as it can be
+            for line, next_line in zip(lines, lines[1:]):
+                if line and next_line:
+                    self.assertGreater(sum(glyph.advance for glyph in line) + next_line[0].advance, width)
+        return layout
+
+    def test_random_text(self):
+        rng = random.Random(0)
+        for _ in range(300):
+            style = Style(make_font(rng))
+            runs = make_runs(rng, style)
+            width = rng.randint(1, 80)
+            for overflow in (Overflow.wrap, Overflow.wrap_characters):
+                self.check_layout(runs, width, overflow)
+
+    def test_glyphs_wider_than_layout(self):
+        style = Style(VariableFont({u'a': 10, u' ': 10}))
+        layout = self.check_layout([GlyphRun(style, u'aaa a aa')], 5, Overflow.wrap)
+        self.assertEqual([u''.join(glyph.char for glyph in line_glyphs(line)) for line in layout.lines],
+            [u'a', u'a', u'a', u' ', u'a', u' ', u'a', u'a'])
+
+    def test_relayout_after_appending(self):
+        # Reusing lines from before the change gives the same lines as a fresh layout
+        rng = random.Random(1)
+        for _ in range(100):
+            style = Style(make_font(rng))
+            runs = make_runs(rng, style)
+            width = rng.randint(1, 80)
+            for overflow in (Overflow.wrap, Overflow.wrap_characters):
+                layout = GlyphLayout(runs, 0, 0, width, overflow=overflow)
+                layout.lines
+                layout.runs = runs[:-1] + make_runs(rng, style)
+                fresh = GlyphLayout(layout.runs, 0, 0, width, overflow=overflow)
+                self.assertEqual([line_glyphs(line) for line in layout.lines],
+                    [line_glyphs(line) for line in fresh.lines])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+'''Packs loose images into a single sprite sheet and a JSON manifest that can be loaded with
+:func:`bacon.SpriteSheet.load_manifest`.  This is a build-time tool and requires PIL (or Pillow)::
+
+    python tools/pack_sprites.py -o res/sprites.png res/cat.png res/mouse.png res/Dust*.png
+
+writes ``res/sprites.png`` and ``res/sprites.json``.  Frames are named after their source file, without
+the extension.
+'''
+import argparse
+import json
+import os
+import sys
+
+from PIL import Image
+
+def pack(sizes, padding, max_size=2048):
+    '''Shelf-pack rectangles into the smallest square power-of-two sheet that holds them.
+
+    :param sizes: list of ``(width, height)``
+    :return: ``(sheet_size, positions)``, where ``positions`` is a list of ``(x, y)`` in the order of ``sizes``
+    '''
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    sheet_size = 64
+    while sheet_size <= max_size:
+        positions = [None] * len(sizes)
+        x = y = shelf_height = 0
+        for i in order:
+            width, height = sizes[i][0] + padding * 2, sizes[i][1] + padding * 2
+            if x + width > sheet_size:
+                x = 0
+                y += shelf_height
+                shelf_height = 0
+            if x + width > sheet_size or y + height > sheet_size:
+                break
+            positions[i] = (x + padding, y + padding)
+            x += width
+            shelf_height = max(shelf_height, height)
+        else:
+            return sheet_size, positions
+        sheet_size *= 2
+    raise ValueError('Images do not fit in a %dx%d sheet' % (max_size, max_size))
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Pack images into a sprite sheet with a JSON manifest.')
+    parser.add_argument('-o', '--output', required=True, help='sheet image to write; the manifest is written alongside with a .json extension')
+    parser.add_argument('-p', '--padding', type=int, default=2, help='transparent texels around each frame, to avoid bleeding when filtered (default 2)')
+    parser.add_argument('images', nargs='+')
+    args = parser.parse_args(argv)
+
+    images = [Image.open(path).convert('RGBA') for path in args.images]
+    sheet_size, positions = pack([image.size for image in images], args.padding)
+
+    sheet = Image.new('RGBA', (sheet_size, sheet_size), (0, 0, 0, 0))
+    frames = []
+    for path, image, (x, y) in zip(args.images, images, positions):
+        sheet.paste(image, (x, y))
+        frames.append({
+            'name': os.path.splitext(os.path.basename(path))[0],
+            'rect': [x, y, x + image.size[0], y + image.size[1]],
+        })
+    sheet.save(args.output)
+
+    # One frame per line, so that manifests diff readably
+    with open(os.path.splitext(args.output)[0] + '.json', 'w') as f:
+        f.write('{"image": %s,\n "frames": [\n  ' % json.dumps(os.path.basename(args.output)))
+        f.write(',\n  '.join(json.dumps(frame, sort_keys=True) for frame in frames))
+        f.write('\n ]}\n')
+
+    print('Packed %d images into %s (%dx%d)' % (len(images), args.output, sheet_size, sheet_size))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])